@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import traceback
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from chalicelib.utils import logger
+from chalicelib.kaltura_utils import validate_ks, search_entries, get_english_captions, get_json_transcript
+from chalicelib.analyze import analyze_video
+from chalicelib.result_store import ResultStore
+from chalicelib.bedrock_batch import build_batch_record, model_id
+from chalicelib.prompters import analyze_chunk_pp
+
+# Offline bulk analysis: pre-analyzes every entry of a category so interactive users hit warm results.
+# Summaries are written to a local SQLite result store; point RESULT_STORE_PATH at it to let the
+# interactive flow use it as a cache. Entries already in the store (for their current caption asset
+# and version) are skipped, so an interrupted run can simply be started again.
+#
+#   python batch_analyze.py --ks <KS> --category-id 12345 --workers 8 --rate 2
+#   python batch_analyze.py --ks <KS> --category-id 12345 --bedrock-batch-dir ./batch-input
+
+PAGE_SIZE = 100  # eSearch page size used to enumerate the entries
+MAX_SEARCH_RESULTS = 10000  # eSearch can't page past the first 10,000 results of a query
+RECORDS_PER_FILE = 50000  # Bedrock batch-inference limit of records per input file
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next_time - now)
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait:
+            time.sleep(wait)
+
+# Worker state, set by _init_worker. Threads share it (and the limiter), every process of a
+# process pool gets its own.
+_worker = {}
+
+def _init_worker(ks, pid, store_path, limiter, bedrock_batch):
+    _worker.update({
+        'ks': ks,
+        'pid': pid,
+        'store_path': store_path,
+        'limiter': limiter,
+        'bedrock_batch': bedrock_batch
+    })
+
+def _init_process_worker(ks, pid, store_path, rate, bedrock_batch):
+    _init_worker(ks, pid, store_path, RateLimiter(rate), bedrock_batch)
+
+def _is_stored(pid, entry_id, caption_id, caption_version):
+    # A short-lived read-only connection per check, so no worker keeps the store open
+    with closing(ResultStore(_worker['store_path'], read_only=True)) as store:
+        return store.get(pid, entry_id, caption_id, caption_version) is not None
+
+def analyze_entry(entry_id):
+    ks, pid, limiter = _worker['ks'], _worker['pid'], _worker['limiter']
+    result = {'entry_id': entry_id, 'status': 'failed', 'caption_id': None, 'caption_version': None, 'summary': None, 'stats': None, 'records': []}
+    try:
+        limiter.acquire()
+        captions = get_english_captions(entry_id, ks, pid)
+        if not captions:
+            result['status'] = 'no_captions'
+            return result
+        caption = captions[0]
+        result['caption_id'] = caption['id']
+        result['caption_version'] = caption['version']
+        if _is_stored(pid, entry_id, caption['id'], caption['version']):
+            result['status'] = 'skipped'
+            return result
+
+        limiter.acquire()
+        segmented_transcript = get_json_transcript(caption['id'], ks, pid)
+        if not segmented_transcript:
+            result['status'] = 'no_captions'
+            return result
+
+        if _worker['bedrock_batch']:
+            result['records'] = [
+                build_batch_record(f"{entry_id}.{caption['id']}.{caption['version']}.{index}", analyze_chunk_pp,
+                                   video_entry_id=entry_id, chunk_transcript=segment.to_json())
+                for index, segment in enumerate(segmented_transcript)
+            ]
+            result['status'] = 'emitted'
+            return result
+
+        summary, stats = analyze_video(entry_id, caption, segmented_transcript, pid, throttle=limiter.acquire)
+        result['stats'] = stats
+        if summary is not None:
+            result['summary'] = summary
+            result['status'] = 'analyzed'
+    except Exception as e:
+        logger.error(f"Error during batch analysis of entry ID {entry_id}: {e}")
+        logger.error(traceback.format_exc())
+    return result
+
+def enumerate_entries(ks, category_id=None, free_text=None, limit=None):
+    """Yields the entry ids of the search, newest first.
+
+    eSearch can't page past the first MAX_SEARCH_RESULTS results of a query, so the search is split
+    into createdAt windows: once a window is paged through, the next one only asks for the entries
+    created at or before the last one seen. Entries sharing that createdAt are only yielded once.
+    """
+    created_at_max = int(time.time())  # entries uploaded during the run don't shift the pages
+    seen_at_max = set()
+    count = 0
+    while True:
+        last_created_at = None
+        seen_at_last = set()
+        page_index = 1
+        while True:
+            videos, total_count = search_entries(ks, category_id, free_text, page_index, PAGE_SIZE, created_at_max)
+            for video in videos:
+                entry_id, created_at = video['entry_id'], video['entry_media_date']
+                if created_at == created_at_max and entry_id in seen_at_max:
+                    continue
+                if limit is not None and count >= limit:
+                    return
+                count += 1
+                yield entry_id
+                if created_at != last_created_at:
+                    last_created_at = created_at
+                    seen_at_last = set()
+                seen_at_last.add(entry_id)
+            if not videos or page_index * PAGE_SIZE >= total_count:
+                return
+            if (page_index + 1) * PAGE_SIZE > MAX_SEARCH_RESULTS:
+                break
+            page_index += 1
+
+        if last_created_at is None:
+            return
+        if last_created_at == created_at_max:
+            # A whole window created in the same second, the rest of that second can't be reached
+            logger.error(f"More than {MAX_SEARCH_RESULTS} entries created at {created_at_max}, skipping the rest of them")
+            created_at_max -= 1
+            seen_at_max = set()
+        else:
+            created_at_max = last_created_at
+            seen_at_max = seen_at_last
+        logger.info(f"Enumerated {count} entries, continuing with the entries created at or before {created_at_max}")
+
+class BatchRecordWriter:
+    def __init__(self, directory, model):
+        self.directory = directory
+        self.model = model
+        self.files = []
+        self._file = None
+        self._count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, record):
+        if self._file is None or self._count >= RECORDS_PER_FILE:
+            self.close()
+            path = os.path.join(self.directory, f"analyze_chunk-{len(self.files) + 1:04d}.jsonl")
+            self._file = open(path, 'w', encoding='utf-8')
+            self._count = 0
+            self.files.append(path)
+        self._file.write(json.dumps(record) + '\n')
+        self._count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def run_batch(args):
+    is_ks_valid, pid = validate_ks(args.ks)
+    if not is_ks_valid:
+        raise SystemExit('Invalid Kaltura session (KS)')
+
+    store = ResultStore(args.store)
+    writer = BatchRecordWriter(args.bedrock_batch_dir, model_id(analyze_chunk_pp)) if args.bedrock_batch_dir else None
+    bedrock_batch = writer is not None
+    print(f'Analyzing the entries of pid {pid} with {args.workers} {args.executor} workers')
+
+    if args.executor == 'process':
+        # Processes can't share a limiter, every one gets an equal share of the overall rate limit
+        worker_rate = args.rate / args.workers if args.rate > 0 else 0
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_process_worker,
+                                       initargs=(args.ks, pid, args.store, worker_rate, bedrock_batch))
+    else:
+        _init_worker(args.ks, pid, args.store, RateLimiter(args.rate), bedrock_batch)
+        executor = ThreadPoolExecutor(max_workers=args.workers)
+
+    def handle_result(result):
+        if result['summary'] is not None:
+            store.put(pid, result['entry_id'], result['caption_id'], result['caption_version'], result['summary'])
+        if writer is not None:
+            for record in result['records']:
+                writer.write(record)
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+        print(f"[{sum(counts.values())}] {result['entry_id']}: {result['status']} {result['stats'] or ''}")
+
+    # Entry ids are streamed into the pool as they are enumerated, with a bounded number in flight
+    counts = {}
+    start_time = time.time()
+    max_in_flight = args.workers * 2
+    with executor:
+        pending = set()
+        try:
+            for entry_id in enumerate_entries(args.ks, args.category_id, args.free_text, args.limit):
+                pending.add(executor.submit(analyze_entry, entry_id))
+                while len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        handle_result(future.result())
+        except Exception as e:
+            # Keep the entries found so far, a re-run skips the ones that were analyzed
+            logger.error(f"Error enumerating the entries of pid {pid}, finishing the {len(pending)} pending ones: {e}")
+            logger.error(traceback.format_exc())
+        for future in wait(pending).done:
+            handle_result(future.result())
+
+    if writer is not None:
+        writer.close()
+        print(f'Bedrock batch input for model {writer.model}: {writer.files}')
+    if args.export_jsonl:
+        print(f'Exported {store.export_jsonl(args.export_jsonl)} summaries to {args.export_jsonl}')
+    store.close()
+    print(f'Batch analysis finished in {time.time() - start_time:.1f} seconds: {counts}')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-analyze Kaltura entries offline into a local result store.')
+    parser.add_argument('--ks', required=True, help='Kaltura session')
+    parser.add_argument('--category-id', help='Analyze the entries of this category (and its sub-categories)')
+    parser.add_argument('--free-text', help='Only entries matching this free-text search')
+    parser.add_argument('--limit', type=int, help='Maximum number of entries to analyze')
+    parser.add_argument('--store', default='results.sqlite3', help='SQLite result store path (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=4, help='Number of parallel workers (default: %(default)s)')
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread', help='Worker pool type (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=2.0, help='Maximum Kaltura/LLM calls per second overall, 0 for unlimited (default: %(default)s)')
+    parser.add_argument('--bedrock-batch-dir', help='Write Bedrock batch-inference input files for the chunk analyses here instead of calling the LLM')
+    parser.add_argument('--export-jsonl', help='Also export the whole result store to this JSONL file')
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    run_batch(parse_args(sys.argv[1:]))
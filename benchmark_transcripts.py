@@ -0,0 +1,43 @@
+import sys
+import json
+import random
+import tracemalloc
+from chalicelib.compact_transcript import CompactTranscript
+
+# Memory benchmark of the in-memory transcript representations: a list of per-sentence dicts
+# (what chunk_transcript used to hold) against CompactTranscript.
+#
+#   python benchmark_transcripts.py [hours of video, default 3]
+
+WORDS = 'the of and to in a is that for it as was with be by on not he this are or his from at which but have an they you were'.split()
+SENTENCES_PER_MINUTE = 12
+
+def caption_objects(hours):
+    rng = random.Random(42)
+    objects = []
+    for index in range(int(hours * 60 * SENTENCES_PER_MINUTE)):
+        start_time = index * 5000
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 24))).capitalize() + '.'
+        objects.append({'startTime': start_time, 'endTime': start_time + 4800, 'content': [{'text': text}]})
+    return objects
+
+def as_dicts(objects):
+    return [{'startTime': entry['startTime'], 'endTime': entry['endTime'], 'text': content['text'].strip()}
+            for entry in objects for content in entry['content']]
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+if __name__ == "__main__":
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    # Both are built from the decoded caption JSON, as get_json_transcript does, and only what they retain is counted
+    raw = json.dumps(caption_objects(hours))
+    dicts, dicts_size = measure(lambda: as_dicts(json.loads(raw)))
+    compact, compact_size = measure(lambda: CompactTranscript.from_caption_objects(json.loads(raw)))
+    print(f'{hours:g} hours, {len(dicts)} sentences')
+    print(f'list of dicts:      {dicts_size / 1024 / 1024:8.2f} MB')
+    print(f'CompactTranscript:  {compact_size / 1024 / 1024:8.2f} MB ({dicts_size / compact_size:.1f}x smaller)')
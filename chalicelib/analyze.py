@@ -1,78 +1,169 @@
 import json
+import time
 import traceback
 from chalicelib.utils import logger, send_ws_message
 from chalicelib.kaltura_utils import get_english_captions, get_json_transcript
+from chalicelib.transcript_utils import chunk_hash, chunks_digest, snap_summary_times
+from chalicelib.chunk_manifest import load_manifest, save_manifest
+from chalicelib.prefetch import get_prefetched_transcript, prefetch_stats
+from chalicelib.result_store import get_stored_summary
+from chalicelib.pipeline import Stage, run_stages
+from chalicelib.cross_video import compute_cross_video_insights
+from chalicelib.chat_context import build_chat_context, estimate_tokens
+from chalicelib.qa_cache import (serialize_transcripts, qa_cache_key, is_context_free,
+                                 get_cached_answer, set_cached_answer, qa_cache_stats)
 from chalicelib.prompters import (generate_followup_questions_pp, analyze_chunk_pp,
-                                  combine_chunk_analyses_pp, cross_video_insights_pp,
-                                  VideoSummary, CrossVideoInsights, FollowupQuestionsResponse)
+                                  combine_chunk_analyses_pp, answer_question_pp,
+                                  VideoSummary, FollowupQuestionsResponse, QAResponse)
+
+
+def load_video_transcript(video_id, ks, pid):
+    # Listing the captions with the requester's KS is the entitlement check for the entry, prefetched
+    # transcripts (shared by every user of the partner) only save the download of that same caption
+    captions = get_english_captions(video_id, ks, pid)
+    if not captions:
+        return None, []
+    caption = captions[0]
+    prefetched = get_prefetched_transcript(pid, video_id)
+    if prefetched is not None and (prefetched['caption']['id'], prefetched['caption'].get('version')) != (caption['id'], caption['version']):
+        logger.info(f"Prefetched transcript of video ID {video_id} is for another caption asset or version than caption ID {caption['id']}")
+        prefetched = None
+    logger.info(f"Processing caption ID: {caption['id']} for video ID: {video_id} (prefetched: {prefetched is not None})")
+    segmented_transcript = prefetched['segments'] if prefetched else get_json_transcript(caption['id'], ks, pid)
+    logger.debug(f"Segmented transcript for caption ID {caption['id']}, total segments: {len(segmented_transcript)}")
+    return caption, segmented_transcript
+
+
+def analyze_video(video_id, caption, segmented_transcript, pid, on_chunk=None, throttle=None):
+    """Analyze the chunks of a video transcript and combine them into a single VideoSummary dict.
+
+    `on_chunk(chunk_index, total_chunks, chunk_json, reused)` is called after every chunk, and `throttle()`
+    before every LLM call. Returns (summary dict or None, re-analysis stats).
+    """
+    manifest = load_manifest(pid, video_id)
+    stored_chunks = manifest.get('chunks', {})
+    analyzed_chunks = {}
+    chunk_hashes = []
+    reused_chunks = 0
+
+    chunk_summaries = []
+    total_chunks = len(segmented_transcript)
+    for index, segment in enumerate(segmented_transcript):
+        segment_text = segment.to_json()
+        segment_hash = chunk_hash(segment_text)
+        chunk_hashes.append(segment_hash)
+        try:
+            reused = segment_hash in stored_chunks
+            if reused:
+                logger.debug(f"Reusing stored analysis for chunk {index + 1}/{total_chunks} of video ID {video_id}")
+                chunk_summary = VideoSummary.model_validate_json(stored_chunks[segment_hash])
+                reused_chunks += 1
+            else:
+                logger.debug(f"Segment {index + 1}/{total_chunks} content for chunk analysis: {segment_text[:500]}...")
+                if throttle:
+                    throttle()
+                chunk_summary: VideoSummary = analyze_chunk_pp(video_entry_id=video_id, chunk_transcript=segment_text)
+            chunk_json = chunk_summary.model_dump_json()
+            logger.info(f"Chunk {index + 1}/{total_chunks} analysis result: {chunk_json[:200]}...{chunk_json[-200:]}")
+            chunk_summaries.append(chunk_summary)
+            analyzed_chunks[segment_hash] = chunk_json
+            if on_chunk:
+                on_chunk(index + 1, total_chunks, chunk_json, reused)
+        except Exception as e:
+            logger.error(f"Error during chunk analysis for video ID {video_id}, chunk {index + 1}: {e}")
+            logger.error(traceback.format_exc())
+
+    stats = {
+        'reused_chunks': reused_chunks,
+        'recomputed_chunks': len(chunk_summaries) - reused_chunks,
+        'reused_combined': False
+    }
+    if not chunk_summaries:
+        logger.error(f"No chunk analysis results found for video ID {video_id}.")
+        return None, stats
+
+    new_manifest = {'caption_id': caption['id'], 'chunks': analyzed_chunks, 'combined': None}
+    combined_summary_dict = None
+    try:
+        total_chunks = len(chunk_summaries)
+        digest = chunks_digest(chunk_hashes)
+        stored_combined = manifest.get('combined') or {}
+        if total_chunks > 1 and len(chunk_summaries) == len(segmented_transcript) and stored_combined.get('digest') == digest:
+            logger.info(f"No chunk changed for video ID {video_id}, reusing the stored combined analysis.")
+            combined_summary_dict = json.loads(stored_combined['summary'])
+            new_manifest['combined'] = stored_combined
+            stats['reused_combined'] = True
+        elif total_chunks > 1:
+            chunk_summaries_json = [summary.model_dump_json() for summary in chunk_summaries]
+            logger.info(f"Creating a combined analysis across chunks for video ID {video_id}")
+            if throttle:
+                throttle()
+            combined_summary: VideoSummary = combine_chunk_analyses_pp(chunk_summaries=chunk_summaries_json)
+            combined_summary_dict = combined_summary.model_dump()
+            combined_summary_json = combined_summary.model_dump_json()
+            logger.info(f"Combined chunk analysis result for video ID {video_id}: {combined_summary_json[:500]}...{combined_summary_json[-500:]}")
+            if len(chunk_summaries) == len(segmented_transcript):
+                new_manifest['combined'] = {'digest': digest, 'summary': combined_summary_json}
+        else:
+            logger.info(f"Only one chunk found for video ID {video_id}, skipping combining analysis.")
+            combined_summary_dict = chunk_summaries[0].model_dump()
+    except Exception as e:
+        logger.error(f"Error during combining chunk analyses for video ID {video_id}: {e}")
+        logger.error(traceback.format_exc())
+
+    if combined_summary_dict is not None:
+        adjusted = snap_summary_times(combined_summary_dict, segmented_transcript[0].transcript)
+        if adjusted:
+            logger.info(f"Moved {adjusted} section/insight start times of video ID {video_id} to the start of their transcript segment")
+
+    logger.info(f"Re-analysis stats for video ID {video_id}: {stats}")
+    save_manifest(pid, video_id, new_manifest)
+    return combined_summary_dict, stats
 
 
 def analyze_videos_ws(app, connection_id, request_id, selected_videos, ks, pid):
     try:
         all_analysis_results = []
         all_transcripts = {}
+        reanalysis_stats = {}
 
         total_videos = len(selected_videos)
 
         for video_id in selected_videos:
             logger.info(f"Processing video ID: {video_id}")
-            captions = get_english_captions(video_id, ks, pid)
-            
-            if captions:
-                caption = captions[0]
-                logger.info(f"Processing caption ID: {caption['id']} for video ID: {video_id}")
-                segmented_transcript = get_json_transcript(caption['id'], ks, pid)
-                logger.debug(f"Segmented transcript for caption ID {caption['id']}, total segments: {len(segmented_transcript)}")
-
-                if not segmented_transcript:
-                    logger.error(f"No caption content found for caption ID: {caption['id']}")
-                    continue
-
-                all_transcripts[video_id] = segmented_transcript
-
-                chunk_summaries = []
-                total_chunks = len(segmented_transcript)
-                for index, segment in enumerate(segmented_transcript):
-                    segment_text = json.dumps(segment)
-                    logger.debug(f"Segment {index + 1}/{total_chunks} content for chunk analysis: {segment_text[:500]}...")
-                    try:
-                        chunk_summary: VideoSummary = analyze_chunk_pp(video_entry_id=video_id, chunk_transcript=segment_text)
-                        chunk_json = chunk_summary.model_dump_json()
-                        logger.info(f"Chunk {index + 1}/{total_chunks} analysis result: {chunk_json[:200]}...{chunk_json[-200:]}")
-                        chunk_summaries.append(chunk_summary)
-                        send_ws_message(app, connection_id, request_id, 'chunk_progress', {
-                            'video_id': video_id,
-                            'chunk_summary': chunk_json,
-                            'chunk_index': index + 1,
-                            'total_chunks': total_chunks,
-                            'total_videos': total_videos
-                        }, pid)
-                    except Exception as e:
-                        logger.error(f"Error during chunk analysis for video ID {video_id}, chunk {index + 1}: {e}")
-                        logger.error(traceback.format_exc())
-
-                if chunk_summaries:
-                    try:
-                        total_chunks = len(chunk_summaries)
-                        if total_chunks > 1:
-                            chunk_summaries_json = [summary.model_dump_json() for summary in chunk_summaries]
-                            logger.info(f"Creating a combined analysis across chunks for video ID {video_id}")
-                            combined_summary: VideoSummary = combine_chunk_analyses_pp(chunk_summaries=chunk_summaries_json)
-                            combined_summary_dict = combined_summary.model_dump()
-                            combined_summary_json = combined_summary.model_dump_json()
-                            logger.info(f"Combined chunk analysis result for video ID {video_id}: {combined_summary_json[:500]}...{combined_summary_json[-500:]}")
-                            all_analysis_results.append(combined_summary_dict)
-                            send_ws_message(app, connection_id, request_id, 'combined_summary', combined_summary_json, pid)
-                        else:
-                            logger.info(f"Only one chunk found for video ID {video_id}, skipping combining analysis.")
-                            combined_summary_dict = chunk_summaries[0].model_dump()
-                            all_analysis_results.append(combined_summary_dict)
-                            send_ws_message(app, connection_id, request_id, 'combined_summary', combined_summary_dict, pid)
-                    except Exception as e:
-                        logger.error(f"Error during combining chunk analyses for video ID {video_id}: {e}")
-                        logger.error(traceback.format_exc())
-                else:
-                    logger.error(f"No chunk analysis results found for video ID {video_id}.")
+            caption, segmented_transcript = load_video_transcript(video_id, ks, pid)
+            if caption is None:
+                continue
+            if not segmented_transcript:
+                logger.error(f"No caption content found for caption ID: {caption['id']}")
+                continue
+
+            all_transcripts[video_id] = segmented_transcript
+
+            # Results pre-computed by the offline batch analysis, for this exact caption asset and version
+            stored_summary = get_stored_summary(pid, video_id, caption['id'], caption['version'])
+            if stored_summary is not None:
+                logger.info(f"Using the stored analysis of caption ID {caption['id']} (version {caption['version']}) for video ID {video_id}")
+                reanalysis_stats[video_id] = {'reused_chunks': 0, 'recomputed_chunks': 0, 'reused_combined': False, 'from_store': True}
+                all_analysis_results.append(stored_summary)
+                send_ws_message(app, connection_id, request_id, 'combined_summary', stored_summary, pid)
+                continue
+
+            def send_chunk_progress(chunk_index, total_chunks, chunk_json, reused):
+                send_ws_message(app, connection_id, request_id, 'chunk_progress', {
+                    'video_id': video_id,
+                    'chunk_summary': chunk_json,
+                    'chunk_index': chunk_index,
+                    'total_chunks': total_chunks,
+                    'total_videos': total_videos,
+                    'reused': reused
+                }, pid)
+
+            combined_summary_dict, reanalysis_stats[video_id] = analyze_video(video_id, caption, segmented_transcript, pid,
+                                                                              on_chunk=send_chunk_progress)
+            if combined_summary_dict is not None:
+                all_analysis_results.append(combined_summary_dict)
+                send_ws_message(app, connection_id, request_id, 'combined_summary', combined_summary_dict, pid)
         
         if not all_analysis_results:
             logger.error("No analysis results found.")
@@ -81,22 +172,31 @@ def analyze_videos_ws(app, connection_id, request_id, selected_videos, ks, pid):
 
         response = {
             "individual_results": all_analysis_results,
-            "transcripts": all_transcripts 
+            "transcripts": {video_id: [segment.to_dicts() for segment in segments] for video_id, segments in all_transcripts.items()},
+            "reanalysis_stats": reanalysis_stats
         }
 
+        def cross_video_insights_stage(inputs):
+            logger.info(f"Creating videos analysis for {selected_videos}")
+            cross_video_insights_dict = compute_cross_video_insights(all_analysis_results)
+            logger.debug(f"Cross video insights result: {cross_video_insights_dict}")
+            send_ws_message(app, connection_id, request_id, 'cross_video_insights', cross_video_insights_dict, pid)
+            return cross_video_insights_dict
+
+        def followup_questions_stage(inputs):
+            logger.info(f"Generating follow-up questions for {selected_videos}")
+            return generate_followup_questions(all_analysis_results)
+
+        # Post-analysis stages only need the per-video summaries, so they run concurrently
+        stages = [Stage('followup_questions', followup_questions_stage)]
         if len(selected_videos) > 1:
-            try:
-                logger.info(f"Creating videos analysis for {selected_videos}")
-                full_summaries = [result["full_summary"] for result in all_analysis_results]
-                cross_video_insights: CrossVideoInsights = cross_video_insights_pp(analysis_results=full_summaries)
-                cross_video_insights_dict = cross_video_insights.model_dump()
-                logger.debug(f"Cross video insights result: {cross_video_insights_dict}")
-                response["cross_video_insights"] = cross_video_insights_dict
-                send_ws_message(app, connection_id, request_id, 'cross_video_insights', cross_video_insights_dict, pid)
-            except Exception as e:
-                logger.error(f"Error during cross video insights analysis: {e}")
-                logger.error(traceback.format_exc())
+            stages.append(Stage('cross_video_insights', cross_video_insights_stage))
+        stage_results, stage_errors, stage_timings = run_stages(stages)
+        response.update(stage_results)
+        response["stage_timings"] = stage_timings
+        logger.info(f"Post-analysis stage timings: {stage_timings}, failed stages: {list(stage_errors)}")
 
+        logger.info(f"Transcript prefetch stats: {prefetch_stats()}")
         logger.info("Video analysis complete")
         send_ws_message(app, connection_id, request_id, 'completed', response, pid)
 
@@ -106,15 +206,67 @@ def analyze_videos_ws(app, connection_id, request_id, selected_videos, ks, pid):
         send_ws_message(app, connection_id, request_id, 'error', str(e), pid)
 
 
-def generate_followup_questions_ws(app, connection_id, request_id, transcripts, pid):
+def compact_summary(result):
+    # The parts of a VideoSummary that are enough to suggest questions, without timestamps and sentences
+    return json.dumps({
+        'entry_id': result.get('entry_id'),
+        'full_summary': result.get('full_summary'),
+        'primary_topics': result.get('primary_topics', []),
+        'sections': [section.get('title') for section in result.get('sections', [])],
+        'insights': [insight.get('text') for insight in result.get('insights', [])],
+        'people': [person.get('name') for person in result.get('people', [])]
+    })
+
+def generate_followup_questions(analysis_results):
+    video_summaries = [compact_summary(result) for result in analysis_results]
+    followup_questions_response: FollowupQuestionsResponse = generate_followup_questions_pp(video_summaries=video_summaries)
+    followup_questions_dict = followup_questions_response.model_dump()
+    logger.debug(f"Follow-up questions: {followup_questions_dict}")
+    return followup_questions_dict
+
+def generate_followup_questions_ws(app, connection_id, request_id, analysis_results, pid):
     try:
         logger.info(f"Generating follow-up questions for analyzed videos.")
-        transcripts_list = [json.dumps(segment) for segments in transcripts.values() for segment in segments]
-        followup_questions_response: FollowupQuestionsResponse = generate_followup_questions_pp(transcripts=transcripts_list)
-        followup_questions_dict = followup_questions_response.model_dump()
-        logger.debug(f"Follow-up questions: {followup_questions_dict}")
+        followup_questions_dict = generate_followup_questions(analysis_results)
         send_ws_message(app, connection_id, request_id, 'followup_questions', followup_questions_dict, pid)
     except Exception as e:
         logger.error(f"Error during generating follow-up questions: {e}")
         logger.error(traceback.format_exc())
         send_ws_message(app, connection_id, request_id, 'error', str(e), pid)
+
+
+def answer_question_ws(app, connection_id, request_id, session_id, question, transcripts, chat_history, pid, suggested=False):
+    try:
+        serialized_transcripts = serialize_transcripts(transcripts)
+        cache_key = qa_cache_key(pid, question, transcripts, serialized_transcripts) if is_context_free(chat_history, suggested) else None
+        cached = get_cached_answer(cache_key) if cache_key else None
+        if cached is not None:
+            response_dict = dict(cached['answer'])
+            response_dict['cache'] = {'hit': True, 'latency_saved': round(cached['latency'], 3)}
+            logger.info(f"Q&A cache hit for session {session_id}, saved {cached['latency']:.2f} seconds, stats: {qa_cache_stats()}")
+            send_ws_message(app, connection_id, request_id, 'chat_response', response_dict, pid)
+            return
+
+        # A cached answer is served to other users, so it must not depend on this user's chat: it is
+        # computed from the question alone
+        prompt_chat_history = [{'sender': 'You', 'message': question}] if cache_key else chat_history
+        chat_summary, recent_messages, context_stats = build_chat_context(session_id, prompt_chat_history)
+        context_stats['prompt_tokens'] = (estimate_tokens(serialized_transcripts) + context_stats['chat_context_tokens'] +
+                                          estimate_tokens(question))
+        logger.info(f"Q&A prompt size for session {session_id}: {context_stats}")
+        start_time = time.time()
+        response: QAResponse = answer_question_pp(question=question, transcripts=serialized_transcripts, chat_summary=chat_summary,
+                                                  prior_chat_messages=recent_messages)
+        latency = time.time() - start_time
+        response_dict = response.model_dump()
+        if cache_key:
+            set_cached_answer(cache_key, response_dict, latency)
+            logger.info(f"Q&A cache miss for session {session_id}, stats: {qa_cache_stats()}")
+        response_dict = dict(response_dict)
+        response_dict['context_stats'] = context_stats
+        response_dict['cache'] = {'hit': False, 'latency_saved': 0}
+        send_ws_message(app, connection_id, request_id, 'chat_response', response_dict, pid)
+    except Exception as e:
+        logger.error(f"Error during answering question: {e}")
+        logger.error(traceback.format_exc())
+        send_ws_message(app, connection_id, request_id, 'error', str(e), pid)
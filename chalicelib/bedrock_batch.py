@@ -0,0 +1,35 @@
+import json
+
+# Builds Bedrock batch-inference records (https://docs.aws.amazon.com/bedrock/latest/userguide/batch-inference-data.html)
+# for the prompters, so the offline analysis can run at batch pricing instead of on-demand.
+# The model input mirrors the request body pydantic_prompter's Bedrock Anthropic provider sends,
+# so the records' outputs parse into the same pydantic models.
+
+SYSTEM_MESSAGE = """Act like a REST API that performs the requested operation the user asked according to guidelines provided.
+                    Your response should be a valid JSON format, strictly adhering to the Pydantic schema provided in the pydantic_schema section. 
+                    Stick to the facts and details in the provided data, and follow the guidelines closely.
+                    Respond in a structured JSON format according to the provided schema.
+                    DO NOT add any other text other than the requested JSON response. 
+
+                    ## pydantic_schema:
+
+                    {schema}
+                    
+                    """
+
+def build_model_input(prompter, **inputs):
+    messages = [message.model_dump() for message in prompter._parse_function_to_messages(**inputs)]
+    model_settings = prompter.llm.model_settings
+    return {
+        "system": SYSTEM_MESSAGE.format(schema=json.dumps(prompter.parser.llm_schema(), indent=4)),
+        "messages": prompter.llm.fix_messages(messages),
+        "stop_sequences": model_settings.get("stop_sequences", ["Human:"]),
+        "anthropic_version": model_settings.get("anthropic_version", "bedrock-2023-05-31"),
+        **model_settings
+    }
+
+def build_batch_record(record_id, prompter, **inputs):
+    return {"recordId": record_id, "modelInput": build_model_input(prompter, **inputs)}
+
+def model_id(prompter):
+    return prompter.llm.model_name
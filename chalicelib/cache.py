@@ -0,0 +1,75 @@
+import time
+import threading
+from collections import OrderedDict
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after they were set.
+
+    When `max_bytes` is given, `sizeof(value)` is used to keep the total size of the cached values under it.
+    """
+
+    def __init__(self, maxsize=256, ttl=60, max_bytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self.current_bytes -= size
+
+    def __contains__(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and item[0] >= time.monotonic()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, size)
+            self.current_bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.current_bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+            return True
+
+    def invalidate(self, predicate=None):
+        with self._lock:
+            keys = [key for key in self._data if predicate is None or predicate(key)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'bytes': self.current_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0
+            }
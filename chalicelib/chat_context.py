@@ -0,0 +1,91 @@
+import hashlib
+import traceback
+from chalicelib.cache import TTLCache
+from chalicelib.config import config
+from chalicelib.utils import logger
+from chalicelib.prompters import summarize_chat_history_pp, ChatSummary
+
+# Keeps the chat part of the Q&A prompt bounded: the most recent messages are sent verbatim
+# (up to config.chat_recent_messages, within config.chat_token_budget) and older ones are folded
+# into a rolling summary. The summary state is cached per session, so each turn only summarizes
+# the messages that left the recent window since the previous turn.
+# Cached values are {'folded': int, 'fingerprint': str, 'summary': str}, keyed by session id.
+
+chat_summary_cache = TTLCache(maxsize=1024, ttl=config.chat_summary_ttl)
+
+def estimate_tokens(text):
+    # Rough estimate (~4 characters per token), good enough for budgeting
+    return (len(text) + 3) // 4
+
+def format_chat_message(message):
+    if isinstance(message, dict):
+        return f"{message.get('sender', 'Unknown')}: {message.get('message', '')}"
+    return str(message)
+
+def _fingerprint(messages):
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(message.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def _rolling_summary(session_id, older_messages):
+    state = chat_summary_cache.get(session_id)
+    if state is None or state['folded'] > len(older_messages) or state['fingerprint'] != _fingerprint(older_messages[:state['folded']]):
+        # New session, expired cache or a different history (e.g. the page was reloaded): start over
+        state = {'folded': 0, 'fingerprint': _fingerprint([]), 'summary': ''}
+
+    new_messages = older_messages[state['folded']:]
+    if new_messages:
+        logger.info(f"Folding {len(new_messages)} chat messages into the summary of session {session_id}")
+        chat_summary: ChatSummary = summarize_chat_history_pp(previous_summary=state['summary'] or 'No summary yet.', new_messages=new_messages)
+        state = {
+            'folded': len(older_messages),
+            'fingerprint': _fingerprint(older_messages),
+            'summary': chat_summary.summary
+        }
+        chat_summary_cache.set(session_id, state)
+    return state['summary']
+
+def build_chat_context(session_id, chat_history, max_recent=None, token_budget=None, summary_batch=None):
+    max_recent = config.chat_recent_messages if max_recent is None else max_recent
+    token_budget = config.chat_token_budget if token_budget is None else token_budget
+    summary_batch = config.chat_summary_batch if summary_batch is None else summary_batch
+
+    messages = [format_chat_message(message) for message in chat_history or []]
+
+    # Walk back from the newest message while the window has room (always keep the newest one)
+    window_start = len(messages)
+    window_tokens = 0
+    while window_start > 0 and len(messages) - window_start < max_recent:
+        message_tokens = estimate_tokens(messages[window_start - 1])
+        if window_tokens + message_tokens > token_budget and window_start < len(messages):
+            break
+        window_tokens += message_tokens
+        window_start -= 1
+
+    # Fold older messages in batches, so the summary isn't re-computed on every turn.
+    # Until a batch is full, the messages waiting for it stay verbatim, as long as they fit the budget.
+    state = chat_summary_cache.get(session_id)
+    folded = state['folded'] if state is not None and state['folded'] <= window_start else 0
+    deferred_tokens = sum(estimate_tokens(message) for message in messages[folded:window_start])
+    if window_start - folded >= summary_batch or window_tokens + deferred_tokens > token_budget:
+        folded = window_start
+
+    summary = ''
+    if folded:
+        try:
+            summary = _rolling_summary(session_id, messages[:folded])
+        except Exception as e:
+            # Without a summary, keep the recent window only rather than failing the question
+            logger.error(f"Error summarizing chat history for session {session_id}: {e}")
+            logger.error(traceback.format_exc())
+
+    recent_messages = messages[folded:]
+    stats = {
+        'history_messages': len(messages),
+        'summarized_messages': folded,
+        'recent_messages': len(recent_messages),
+        'chat_context_tokens': estimate_tokens(summary) + sum(estimate_tokens(message) for message in recent_messages)
+    }
+    return summary, recent_messages, stats
@@ -0,0 +1,93 @@
+import os
+import json
+import traceback
+import boto3
+from botocore.exceptions import ClientError
+from chalicelib.config import config
+from chalicelib.utils import logger
+
+# Per-entry manifest of analyzed chunks, used to re-analyze only the chunks that changed
+# after a caption asset was re-generated or edited. Layout:
+# {"caption_id": str, "chunks": {chunk_hash: VideoSummary json}, "combined": {"digest": str, "summary": VideoSummary json}}
+#
+# Caption edits usually come long after the first analysis, so manifests have to outlive the Lambda
+# container: they are stored in S3 (CHUNK_MANIFEST_BUCKET, one object per pid/entry_id) or in a
+# durable directory such as an EFS mount (CHUNK_MANIFEST_DIR). With neither set, every analysis is full.
+# Manifests larger than config.chunk_manifest_max_bytes are not stored.
+
+_s3_client = None
+
+def _get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+def _empty_manifest():
+    return {'chunks': {}, 'combined': None}
+
+def _manifest_key(pid, entry_id):
+    return f"{config.chunk_manifest_prefix}{pid}/{entry_id}.json"
+
+def _manifest_path(pid, entry_id):
+    return os.path.join(config.chunk_manifest_dir, str(pid), f"{entry_id}.json")
+
+def manifests_enabled():
+    return bool(config.chunk_manifest_bucket or config.chunk_manifest_dir)
+
+def _read_manifest(pid, entry_id):
+    if config.chunk_manifest_bucket:
+        try:
+            response = _get_s3_client().get_object(Bucket=config.chunk_manifest_bucket, Key=_manifest_key(pid, entry_id))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+        return response['Body'].read()
+    try:
+        with open(_manifest_path(pid, entry_id), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def _write_manifest(pid, entry_id, body):
+    if config.chunk_manifest_bucket:
+        _get_s3_client().put_object(Bucket=config.chunk_manifest_bucket, Key=_manifest_key(pid, entry_id), Body=body,
+                                    ContentType='application/json')
+        return
+    path = _manifest_path(pid, entry_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+
+def load_manifest(pid, entry_id):
+    if not manifests_enabled():
+        return _empty_manifest()
+    try:
+        body = _read_manifest(pid, entry_id)
+        if body is None:
+            return _empty_manifest()
+        manifest = json.loads(body)
+        logger.debug(f"Loaded chunk manifest for entry ID {entry_id}: {len(manifest.get('chunks', {}))} chunks")
+        return manifest
+    except Exception as e:
+        logger.error(f"Error loading chunk manifest for entry ID {entry_id}: {e}")
+        logger.error(traceback.format_exc())
+        return _empty_manifest()
+
+def save_manifest(pid, entry_id, manifest):
+    if not manifests_enabled():
+        return
+    try:
+        body = json.dumps(manifest).encode('utf-8')
+        if len(body) > config.chunk_manifest_max_bytes:
+            logger.warning(f"Not saving chunk manifest for entry ID {entry_id}: {len(body)} bytes is over the "
+                           f"{config.chunk_manifest_max_bytes} bytes limit")
+            return
+        _write_manifest(pid, entry_id, body)
+        logger.debug(f"Saved chunk manifest for entry ID {entry_id}: {len(manifest.get('chunks', {}))} chunks, {len(body)} bytes")
+    except Exception as e:
+        logger.error(f"Error saving chunk manifest for entry ID {entry_id}: {e}")
+        logger.error(traceback.format_exc())
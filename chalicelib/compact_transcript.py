@@ -0,0 +1,131 @@
+import json
+from array import array
+from bisect import bisect_right
+
+# Columnar in-memory transcript: start/end times in typed arrays, all sentence texts in a single
+# string with an offsets array. Segments and chunks are lightweight views over it, so chunking and
+# time lookups don't copy the transcript. The list-of-dicts form ({'startTime', 'endTime', 'text'})
+# is only built when a chunk is serialized.
+
+def _times_array(values):
+    # Kaltura caption times are integer milliseconds; keep them integers so the JSON stays the same
+    return array('q', values) if all(isinstance(value, int) for value in values) else array('d', values)
+
+class CompactTranscript:
+    __slots__ = ('start_times', 'end_times', 'text', 'offsets')
+
+    def __init__(self, start_times, end_times, texts):
+        self.start_times = _times_array(start_times)
+        self.end_times = _times_array(end_times)
+        self.text = ''.join(texts)
+        self.offsets = array('q', [0])
+        position = 0
+        for text in texts:
+            position += len(text)
+            self.offsets.append(position)
+
+    @classmethod
+    def from_caption_objects(cls, data):
+        """Builds a transcript from the caption asset JSON objects, one segment per non-empty line."""
+        start_times, end_times, texts = [], [], []
+        for entry in sorted(data, key=lambda x: x['startTime']):
+            for content in entry['content']:
+                for sentence in content['text'].split('\n'):
+                    if sentence:
+                        start_times.append(entry['startTime'])
+                        end_times.append(entry['endTime'])
+                        texts.append(sentence.strip())
+        return cls(start_times, end_times, texts)
+
+    @classmethod
+    def from_dicts(cls, segments):
+        return cls([segment['startTime'] for segment in segments], [segment['endTime'] for segment in segments],
+                   [segment['text'] for segment in segments])
+
+    def __len__(self):
+        return len(self.start_times)
+
+    @property
+    def nbytes(self):
+        # Approximate memory footprint: the text buffer plus the three arrays
+        return (len(self.text) + self.start_times.itemsize * len(self.start_times) +
+                self.end_times.itemsize * len(self.end_times) + self.offsets.itemsize * len(self.offsets))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError('CompactTranscript slices must be contiguous')
+            return TranscriptSlice(self, start, stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('segment index out of range')
+        return SegmentView(self, index)
+
+    def __iter__(self):
+        return (SegmentView(self, index) for index in range(len(self)))
+
+    def segment_text(self, index):
+        return self.text[self.offsets[index]:self.offsets[index + 1]]
+
+    def segment_index_at(self, timestamp):
+        """Index of the last segment starting at or before timestamp (0 if it is before the first one)."""
+        return max(bisect_right(self.start_times, timestamp) - 1, 0)
+
+    def segment_at(self, timestamp):
+        return SegmentView(self, self.segment_index_at(timestamp)) if len(self) else None
+
+class SegmentView:
+    __slots__ = ('transcript', 'index')
+
+    def __init__(self, transcript, index):
+        self.transcript = transcript
+        self.index = index
+
+    @property
+    def start_time(self):
+        return self.transcript.start_times[self.index]
+
+    @property
+    def end_time(self):
+        return self.transcript.end_times[self.index]
+
+    @property
+    def text(self):
+        return self.transcript.segment_text(self.index)
+
+    def to_dict(self):
+        return {'startTime': self.start_time, 'endTime': self.end_time, 'text': self.text}
+
+class TranscriptSlice:
+    __slots__ = ('transcript', 'start', 'stop')
+
+    def __init__(self, transcript, start, stop):
+        self.transcript = transcript
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        return (SegmentView(self.transcript, index) for index in range(self.start, self.stop))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError('TranscriptSlice slices must be contiguous')
+            return TranscriptSlice(self.transcript, self.start + start, self.start + stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('segment index out of range')
+        return SegmentView(self.transcript, self.start + index)
+
+    def to_dicts(self):
+        return [segment.to_dict() for segment in self]
+
+    def to_json(self):
+        return json.dumps(self.to_dicts())
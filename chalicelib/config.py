@@ -11,7 +11,40 @@ class Config:
     def __init__(self):
         # Load from environment variables
         self.service_url = os.getenv('SERVICE_URL', 'https://cdnapi-ev.kaltura.com/')
+        self.chunk_manifest_bucket = os.getenv('CHUNK_MANIFEST_BUCKET', '')
+        self.chunk_manifest_prefix = os.getenv('CHUNK_MANIFEST_PREFIX', 'chunk-manifests/')
+        self.chunk_manifest_dir = os.getenv('CHUNK_MANIFEST_DIR', '')
+        self.chunk_manifest_max_bytes = int(os.getenv('CHUNK_MANIFEST_MAX_BYTES', str(4 * 1024 * 1024)))
+        self.video_search_cache_ttl = int(os.getenv('VIDEO_SEARCH_CACHE_TTL', '60'))
+        self.video_search_cache_size = int(os.getenv('VIDEO_SEARCH_CACHE_SIZE', '256'))
+        self.transcript_prefetch = os.getenv('TRANSCRIPT_PREFETCH', 'false').lower() == 'true'
+        self.prefetch_bucket = os.getenv('PREFETCH_BUCKET', '')
+        self.prefetch_prefix = os.getenv('PREFETCH_PREFIX', 'transcript-prefetch/')
+        self.prefetch_ttl = int(os.getenv('PREFETCH_TTL', '600'))
+        self.prefetch_max_bytes = int(os.getenv('PREFETCH_MAX_BYTES', str(64 * 1024 * 1024)))
+        self.prefetch_max_entry_bytes = int(os.getenv('PREFETCH_MAX_ENTRY_BYTES', str(16 * 1024 * 1024)))
+        self.prefetch_workers = int(os.getenv('PREFETCH_WORKERS', '4'))
+        self.prefetch_wait_seconds = float(os.getenv('PREFETCH_WAIT_SECONDS', '20'))
+        self.chat_recent_messages = int(os.getenv('CHAT_RECENT_MESSAGES', '6'))
+        self.chat_token_budget = int(os.getenv('CHAT_TOKEN_BUDGET', '4000'))
+        self.chat_summary_batch = int(os.getenv('CHAT_SUMMARY_BATCH', '4'))
+        self.chat_summary_ttl = int(os.getenv('CHAT_SUMMARY_TTL', '3600'))
+        self.qa_cache_ttl = int(os.getenv('QA_CACHE_TTL', '3600'))
+        self.qa_cache_size = int(os.getenv('QA_CACHE_SIZE', '512'))
+        self.result_store_path = os.getenv('RESULT_STORE_PATH', '')
+        self.cross_video_group_size = int(os.getenv('CROSS_VIDEO_GROUP_SIZE', '8'))
+        self.cross_video_workers = int(os.getenv('CROSS_VIDEO_WORKERS', '4'))
         
         logger.info(f"Service URL: {self.service_url}")
+        if self.chunk_manifest_bucket:
+            logger.info(f"Chunk manifests: s3://{self.chunk_manifest_bucket}/{self.chunk_manifest_prefix}")
+        elif self.chunk_manifest_dir:
+            logger.info(f"Chunk manifests: {self.chunk_manifest_dir} (must be durable, e.g. an EFS mount)")
+        else:
+            logger.warning("Chunk manifests disabled (set CHUNK_MANIFEST_BUCKET), every re-analysis is a full analysis")
+        logger.info(f"Transcript prefetch enabled: {self.transcript_prefetch}")
+        if self.transcript_prefetch and not self.prefetch_bucket:
+            logger.warning("Transcript prefetch has no PREFETCH_BUCKET, prefetched transcripts are only seen by the same container")
+        logger.info(f"Result store path: {self.result_store_path or '(disabled)'}")
 
 config = Config()
@@ -0,0 +1,88 @@
+import re
+import json
+import math
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from chalicelib.config import config
+from chalicelib.utils import logger
+from chalicelib.prompters import cross_video_insights_pp, merge_cross_video_insights_pp, CrossVideoInsights
+
+# Cross-video insights for large selections: the video summaries are grouped by topic similarity,
+# insights are computed per group in parallel, and the group results are merged in stages.
+# Every LLM call gets at most config.cross_video_group_size inputs, whatever the selection size.
+
+STOP_WORDS = frozenset("""
+a an and are as at be been but by can for from has have how in into is it its of on or that the their
+them then there these they this to was were what when which who will with video videos discuss discusses
+discussed discussing speaker speakers also about over more most such than through
+""".split())
+
+def _tokens(text):
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if len(token) > 2 and token not in STOP_WORDS]
+
+def _term_counts(result):
+    # Primary topics are the strongest similarity signal, so they count double
+    counts = Counter(_tokens(result.get('full_summary', '')))
+    for topic in result.get('primary_topics', []):
+        for token in _tokens(topic):
+            counts[token] += 2
+    return counts
+
+def _tfidf_vectors(results):
+    term_counts = [_term_counts(result) for result in results]
+    document_frequency = Counter(term for counts in term_counts for term in counts)
+    total = len(results)
+    vectors = []
+    for counts in term_counts:
+        vector = {term: count * math.log((1 + total) / (1 + document_frequency[term])) for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        vectors.append({term: weight / norm for term, weight in vector.items()})
+    return vectors
+
+def _cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+def group_by_topic(results, group_size):
+    """Greedily groups the results (VideoSummary dicts) into lists of indexes of up to group_size similar videos."""
+    vectors = _tfidf_vectors(results)
+    remaining = list(range(len(results)))
+    groups = []
+    while remaining:
+        seed = remaining.pop(0)
+        remaining.sort(key=lambda index: _cosine(vectors[seed], vectors[index]), reverse=True)
+        group = [seed] + remaining[:group_size - 1]
+        remaining = remaining[group_size - 1:]
+        groups.append(group)
+    return groups
+
+def _group_insights(summaries):
+    cross_video_insights: CrossVideoInsights = cross_video_insights_pp(analysis_results=summaries)
+    return cross_video_insights.model_dump()
+
+def _merge_insights(insights):
+    if len(insights) == 1:
+        return insights[0]
+    merged: CrossVideoInsights = merge_cross_video_insights_pp(group_insights=[json.dumps(item) for item in insights])
+    return merged.model_dump()
+
+def compute_cross_video_insights(results, group_size=None, max_workers=None):
+    group_size = config.cross_video_group_size if group_size is None else group_size
+    max_workers = config.cross_video_workers if max_workers is None else max_workers
+    group_size = max(group_size, 2)
+
+    if len(results) <= group_size:
+        return _group_insights([result['full_summary'] for result in results])
+
+    groups = group_by_topic(results, group_size)
+    logger.info(f"Computing cross video insights for {len(results)} videos in {len(groups)} topic groups: {groups}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        insights = list(executor.map(_group_insights, [[results[index]['full_summary'] for index in group] for group in groups]))
+
+        # Staged reduction: merge up to group_size results per call until a single one is left
+        while len(insights) > 1:
+            batches = [insights[index:index + group_size] for index in range(0, len(insights), group_size)]
+            logger.info(f"Merging {len(insights)} cross video insights in {len(batches)} batches")
+            insights = list(executor.map(_merge_insights, batches))
+    return insights[0]
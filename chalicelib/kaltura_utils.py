@@ -1,6 +1,7 @@
 import re
 import time
 import json
+import base64
 import requests
 import traceback
 from lxml import etree
@@ -14,10 +15,12 @@ from KalturaClient.Plugins.ElasticSearch import (
     KalturaESearchCaptionItem, KalturaESearchCaptionFieldName, KalturaESearchItemType,
     KalturaESearchEntryItem, KalturaESearchEntryFieldName, KalturaESearchOrderBy,
     KalturaESearchEntryOrderByItem, KalturaESearchEntryOrderByFieldName, KalturaESearchSortOrder,
-    KalturaESearchCategoryEntryItem, KalturaESearchCategoryEntryFieldName, KalturaCategoryEntryStatus, KalturaESearchUnifiedItem
+    KalturaESearchCategoryEntryItem, KalturaESearchCategoryEntryFieldName, KalturaCategoryEntryStatus, KalturaESearchUnifiedItem,
+    KalturaESearchRange
 )
 from chalicelib.config import config
 from chalicelib.utils import logger
+from chalicelib.cache import TTLCache
 from chalicelib.transcript_utils import chunk_transcript
 
 class KalturaLogger(IKalturaLogger):
@@ -122,12 +125,36 @@ def get_english_captions(entry_id, ks, pid):
     caption_filter.orderBy = KalturaCaptionAssetOrderBy.CREATED_AT_DESC
     pager = KalturaFilterPager()
     result = client.caption.captionAsset.list(caption_filter, pager)
-    captions = [{'id': caption.id, 'label': caption.label, 'language': caption.language} for caption in result.objects]
+    # The version goes up when a caption is edited or re-generated in place (the id stays the same)
+    captions = [{'id': caption.id, 'label': caption.label, 'language': caption.language, 'version': str(caption.version or '')}
+                for caption in result.objects]
     logger.debug(f"Captions for entry ID {entry_id}: {captions}")
     return captions
 
-def fetch_videos(ks, pid, category_ids=None, free_text=None, number_of_videos=6):
-    client = get_kaltura_client(ks)
+video_search_cache = TTLCache(maxsize=config.video_search_cache_size, ttl=config.video_search_cache_ttl)
+
+def encode_cursor(page_index, page_size):
+    payload = json.dumps({'p': page_index, 's': page_size}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+def decode_cursor(cursor, page_size):
+    if not cursor:
+        return 1
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        page_index = int(payload['p'])
+        if payload.get('s') != page_size or page_index < 1:
+            raise ValueError(f"cursor does not match page size {page_size}")
+        return page_index
+    except Exception as e:
+        logger.error(f"Invalid search cursor {cursor}, starting from the first page: {e}")
+        return 1
+
+def invalidate_video_search_cache(pid):
+    removed = video_search_cache.invalidate(lambda key: key[0] == pid)
+    logger.debug(f"Invalidated {removed} cached video search pages for pid: {pid}")
+
+def build_video_search_params(category_ids=None, free_text=None, created_at_max=None):
     search_params = KalturaESearchEntryParams()
     search_params.orderBy = KalturaESearchOrderBy()
     order_item = KalturaESearchEntryOrderByItem()
@@ -166,30 +193,63 @@ def fetch_videos(ks, pid, category_ids=None, free_text=None, number_of_videos=6)
         unified_item.itemType = KalturaESearchItemType.PARTIAL
         search_params.searchOperator.searchItems.append(unified_item)
 
+    if created_at_max is not None:
+        created_at_item = KalturaESearchEntryItem()
+        created_at_item.fieldName = KalturaESearchEntryFieldName.CREATED_AT
+        created_at_item.addHighlight = False
+        created_at_item.itemType = KalturaESearchItemType.RANGE
+        created_at_item.range = KalturaESearchRange()
+        created_at_item.range.lessThanOrEqual = created_at_max
+        search_params.searchOperator.searchItems.append(created_at_item)
+
+    return search_params
+
+def project_entry(entry):
+    # Keep only the fields the frontend and the analysis flow use, so cached pages stay small
+    return {
+        "entry_id": str(entry.id),
+        "entry_name": str(entry.name),
+        "entry_description": str(entry.description or ""),
+        "entry_media_type": int(entry.mediaType.value or 0),
+        "entry_media_date": int(entry.createdAt or 0),
+        "entry_ms_duration": int(entry.msDuration or 0),
+        "entry_last_played_at": int(entry.lastPlayedAt or 0),
+        "entry_application": str(entry.application or ""),
+        "entry_creator_id": str(entry.creatorId or ""),
+        "entry_tags": str(entry.tags or ""),
+        "entry_reference_id": str(entry.referenceId or "")
+    }
+
+def search_entries(ks, category_ids=None, free_text=None, page_index=1, page_size=6, created_at_max=None):
+    """Runs one eSearch page, newest entries first. Returns (projected entries, total count)."""
+    client = get_kaltura_client(ks)
+    search_params = build_video_search_params(category_ids, free_text, created_at_max)
+
     pager = KalturaFilterPager()
-    pager.pageIndex = 1
-    pager.pageSize = number_of_videos
+    pager.pageIndex = page_index
+    pager.pageSize = page_size
 
     result = client.elasticSearch.eSearch.searchEntry(search_params, pager)
+    return [project_entry(entry.object) for entry in result.objects], int(result.totalCount or 0)
+
+def fetch_videos(ks, pid, category_ids=None, free_text=None, number_of_videos=6, cursor=None):
+    page_index = decode_cursor(cursor, number_of_videos)
+    cache_key = (pid, category_ids, free_text, page_index, number_of_videos)
+    page = video_search_cache.get(cache_key)
+    if page is not None:
+        logger.debug(f"Video search cache hit: {cache_key}, stats: {video_search_cache.stats()}")
+        return page
 
-    videos = []
-    for entry in result.objects:
-        entry_info = {
-            "entry_id": str(entry.object.id),
-            "entry_name": str(entry.object.name),
-            "entry_description": str(entry.object.description or ""),
-            "entry_media_type": int(entry.object.mediaType.value or 0),
-            "entry_media_date": int(entry.object.createdAt or 0),
-            "entry_ms_duration": int(entry.object.msDuration or 0),
-            "entry_last_played_at": int(entry.object.lastPlayedAt or 0),
-            "entry_application": str(entry.object.application or ""),
-            "entry_creator_id": str(entry.object.creatorId or ""),
-            "entry_tags": str(entry.object.tags or ""),
-            "entry_reference_id": str(entry.object.referenceId or "")
-        }
-        videos.append(entry_info)
-
-    return videos
+    videos, total_count = search_entries(ks, category_ids, free_text, page_index, number_of_videos)
+    page = {
+        "videos": videos,
+        "total_count": total_count,
+        "next_cursor": encode_cursor(page_index + 1, number_of_videos) if page_index * number_of_videos < total_count else None,
+        "prev_cursor": encode_cursor(page_index - 1, number_of_videos) if page_index > 1 else None
+    }
+    video_search_cache.set(cache_key, page)
+    logger.debug(f"Video search cache miss: {cache_key}, stats: {video_search_cache.stats()}")
+    return page
 
 def get_json_transcript(caption_asset_id, ks, pid):
     try:
@@ -202,7 +262,7 @@ def get_json_transcript(caption_asset_id, ks, pid):
         logger.debug(f"Raw JSON Captions: captionAssetId: {caption_asset_id}: {json.dumps(transcript)}")
 
         segmented_transcripts = chunk_transcript(transcript)
-        logger.debug(f"Segmented transcripts: {segmented_transcripts}")
+        logger.debug(f"Segmented transcripts: {[len(segment) for segment in segmented_transcripts]} sentences per chunk")
         return segmented_transcripts
     except requests.RequestException as e:
         logger.error(f"HTTP error while fetching captions: {e}")
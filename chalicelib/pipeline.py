@@ -0,0 +1,68 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from chalicelib.utils import logger
+
+class Stage:
+    """A pipeline step: `func` is called with a dict of its dependencies' results, keyed by stage name."""
+
+    def __init__(self, name, func, depends_on=()):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+
+def _run_stage(stage, inputs):
+    start_time = time.time()
+    try:
+        return stage.func(inputs), None, time.time() - start_time
+    except Exception as e:
+        logger.error(f"Error in pipeline stage {stage.name}: {e}")
+        logger.error(traceback.format_exc())
+        return None, e, time.time() - start_time
+
+def run_stages(stages, max_workers=4):
+    """Run the stages as a dependency graph, each one as soon as all of its dependencies succeeded.
+
+    A failed stage only skips the stages that depend on it. Returns (results, errors, timings) dicts keyed by stage name.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [name for name in stage.depends_on if name not in by_name]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {missing}")
+
+    results, errors, timings = {}, {}, {}
+    waiting = list(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while waiting or running:
+            scheduled = True
+            while scheduled:
+                # Skipping a stage can unblock (skip) the stages that depend on it, so scan until nothing changes
+                scheduled = False
+                for stage in list(waiting):
+                    failed = [name for name in stage.depends_on if name in errors]
+                    if failed:
+                        waiting.remove(stage)
+                        errors[stage.name] = RuntimeError(f"skipped, failed dependencies: {failed}")
+                        logger.error(f"Skipping pipeline stage {stage.name}, failed dependencies: {failed}")
+                        scheduled = True
+                    elif all(name in results for name in stage.depends_on):
+                        waiting.remove(stage)
+                        inputs = {name: results[name] for name in stage.depends_on}
+                        running[executor.submit(_run_stage, stage, inputs)] = stage
+            if not running:
+                if waiting:
+                    raise ValueError(f"Dependency cycle between stages: {[stage.name for stage in waiting]}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                result, error, elapsed = future.result()
+                timings[stage.name] = round(elapsed, 3)
+                if error is None:
+                    results[stage.name] = result
+                else:
+                    errors[stage.name] = error
+                logger.info(f"Pipeline stage {stage.name} {'failed' if error else 'completed'} in {elapsed:.2f} seconds")
+    return results, errors, timings
@@ -0,0 +1,175 @@
+import gzip
+import json
+import time
+import threading
+import traceback
+import boto3
+from concurrent.futures import ThreadPoolExecutor, wait
+from botocore.exceptions import ClientError
+from chalice import WebsocketDisconnectedError
+from chalicelib.cache import TTLCache
+from chalicelib.config import config
+from chalicelib.utils import logger
+from chalicelib.kaltura_utils import get_english_captions, get_json_transcript
+from chalicelib.transcript_utils import chunk_transcript
+from chalicelib.compact_transcript import CompactTranscript
+
+# Speculative transcript prefetch: after get_videos responds, the English captions of the listed
+# entries are resolved and downloaded in the background, so analyze_videos only has to list the
+# captions with the requester's KS (the entitlement check) before starting the LLM work. On Lambda,
+# analyze_videos usually runs in another container than the get_videos that started the prefetch,
+# so prefetched transcripts are stored in S3 (PREFETCH_BUCKET, one gzipped object per pid/entry_id,
+# valid for config.prefetch_ttl seconds). The in-memory cache in front of it only saves the S3 read
+# when both requests land on the same container (or with `chalice local`).
+# Values are {'caption': {...}, 'segments': [...], 'size': int}, keyed by (pid, entry_id).
+#
+# Prefetching stops as soon as the websocket connection that asked for it is gone: every entry
+# checks the connection with API Gateway before downloading anything.
+
+def _prefetched_size(value):
+    return value['size']
+
+transcript_cache = TTLCache(maxsize=256, ttl=config.prefetch_ttl, max_bytes=config.prefetch_max_bytes, sizeof=_prefetched_size)
+
+_executor = ThreadPoolExecutor(max_workers=config.prefetch_workers, thread_name_prefix='transcript-prefetch')
+_lock = threading.RLock()  # re-entrant: done callbacks of already finished futures run while it is held
+_connection_futures = {}  # connection_id -> [Future]
+_pending = {}  # (pid, entry_id) -> Future
+_stats = {'requested': 0, 'prefetched': 0, 'too_large': 0, 'no_captions': 0, 'cancelled': 0, 'errors': 0,
+          'hits': 0, 'shared_hits': 0, 'misses': 0}
+_s3_client = None
+
+def _get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+def prefetch_stats():
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+    stats['hit_rate'] = ((stats['hits'] + stats['shared_hits']) / lookups) if lookups else 0.0
+    stats['cache'] = transcript_cache.stats()
+    return stats
+
+def _object_key(pid, entry_id):
+    return f"{config.prefetch_prefix}{pid}/{entry_id}.json.gz"
+
+def _store_shared(pid, entry_id, caption, segments):
+    transcript = segments[0].transcript
+    body = gzip.compress(json.dumps({'caption': caption, 'segments': transcript[:].to_dicts()}).encode('utf-8'))
+    _get_s3_client().put_object(Bucket=config.prefetch_bucket, Key=_object_key(pid, entry_id), Body=body,
+                                ContentType='application/json', ContentEncoding='gzip')
+
+def _load_shared(pid, entry_id):
+    try:
+        response = _get_s3_client().get_object(Bucket=config.prefetch_bucket, Key=_object_key(pid, entry_id))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+    if time.time() - response['LastModified'].timestamp() > config.prefetch_ttl:
+        return None
+    prefetched = json.loads(gzip.decompress(response['Body'].read()))
+    transcript = CompactTranscript.from_dicts(prefetched['segments'])
+    return {'caption': prefetched['caption'], 'segments': chunk_transcript(transcript), 'size': transcript.nbytes}
+
+def _connection_alive(app, connection_id):
+    try:
+        app.websocket_api.info(connection_id)
+        return True
+    except WebsocketDisconnectedError:
+        return False
+    except Exception as e:
+        # Can't tell, keep prefetching rather than losing it
+        logger.error(f"Error checking websocket connection {connection_id}: {e}")
+        return True
+
+def _prefetch_entry(app, connection_id, ks, pid, entry_id):
+    try:
+        if not _connection_alive(app, connection_id):
+            _count('cancelled')
+            return
+        captions = get_english_captions(entry_id, ks, pid)
+        if not captions:
+            _count('no_captions')
+            return
+        caption = captions[0]
+        segments = get_json_transcript(caption['id'], ks, pid)
+        if not segments:
+            _count('no_captions')
+            return
+        size = segments[0].transcript.nbytes
+        if size > config.prefetch_max_entry_bytes:
+            logger.debug(f"Prefetched transcript for entry ID {entry_id} is too large to cache ({size} bytes)")
+            _count('too_large')
+            return
+        if not _connection_alive(app, connection_id):
+            _count('cancelled')
+            return
+        if config.prefetch_bucket:
+            _store_shared(pid, entry_id, caption, segments)
+        transcript_cache.set((pid, entry_id), {'caption': caption, 'segments': segments, 'size': size})
+        _count('prefetched')
+        logger.debug(f"Prefetched transcript for entry ID {entry_id}: caption ID {caption['id']}, {len(segments)} chunks, {size} bytes")
+    except Exception as e:
+        _count('errors')
+        logger.error(f"Error prefetching transcript for entry ID {entry_id}: {e}")
+        logger.error(traceback.format_exc())
+
+def _prefetch_done(key, future):
+    with _lock:
+        if _pending.get(key) is future:
+            del _pending[key]
+        if future.cancelled():
+            _stats['cancelled'] += 1
+
+def prefetch_transcripts(app, connection_id, ks, pid, entry_ids):
+    with _lock:
+        futures = _connection_futures.setdefault(connection_id, [])
+        for entry_id in entry_ids:
+            key = (pid, entry_id)
+            if key in _pending or key in transcript_cache:
+                continue
+            _stats['requested'] += 1
+            future = _executor.submit(_prefetch_entry, app, connection_id, ks, pid, entry_id)
+            _pending[key] = future
+            futures.append(future)
+            future.add_done_callback(lambda f, key=key: _prefetch_done(key, f))
+    logger.info(f"Prefetching transcripts for {len(futures)} entries, connection: {connection_id}")
+
+def wait_for_prefetch(connection_id, timeout):
+    # Lambda freezes background threads once the handler returns, so the handler that started the
+    # prefetch waits for it (the client already has its response) before returning. Entries that
+    # didn't start by then are dropped, they would only run whenever the container is reused.
+    with _lock:
+        futures = _connection_futures.pop(connection_id, [])
+    if not futures:
+        return
+    done, not_done = wait(futures, timeout=timeout)
+    for future in not_done:
+        future.cancel()
+    logger.info(f"Transcript prefetch finished {len(done)}/{len(futures)} entries, stats: {prefetch_stats()}")
+
+def get_prefetched_transcript(pid, entry_id):
+    prefetched = transcript_cache.get((pid, entry_id))
+    if prefetched is not None:
+        _count('hits')
+        return prefetched
+    if config.transcript_prefetch and config.prefetch_bucket:
+        try:
+            prefetched = _load_shared(pid, entry_id)
+        except Exception as e:
+            logger.error(f"Error loading the prefetched transcript for entry ID {entry_id}: {e}")
+            logger.error(traceback.format_exc())
+        if prefetched is not None:
+            transcript_cache.set((pid, entry_id), prefetched)
+            _count('shared_hits')
+            return prefetched
+    _count('misses')
+    return None
@@ -36,6 +36,9 @@ class FollowupQuestion(BaseModel):
 class FollowupQuestionsResponse(BaseModel):
     questions: List[FollowupQuestion] = Field(description="A list of suggested follow-up questions or tasks.")
 
+class ChatSummary(BaseModel):
+    summary: str = Field(description="Concise summary of the conversation so far, keeping the user's requests, the answers given, and any facts, names or decisions they refer to. Up to 10 sentences long.")
+
 class QAResponse(BaseModel):
     answer: str = Field(description="Markdown formatted reply/answers to the user's request/questions based on the provided videos context.")
 
@@ -125,11 +128,43 @@ def cross_video_insights_pp(analysis_results: List[str]) -> CrossVideoInsights:
     """
 
 @Prompter(llm="bedrock", model_name="anthropic.claude-3-sonnet-20240229-v1:0", jinja=True, model_settings={
+    "max_tokens": 4096,
+    "temperature": 0,
+    "top_p": 0.999,
+    "top_k": 1,
+    "stop_sequences": ["<|end_of_json|>"]
+})
+def merge_cross_video_insights_pp(group_insights: List[str]) -> CrossVideoInsights:
+    """
+    - user:
+        Below are cross-video analyses, each one computed over a different group of related videos.
+        Your task is to merge them into a single cross-videos analysis that spans all the groups, according to the guidelines.
+
+        ## Guidelines:
+
+        1. Merge insights, themes, views and sentiments that appear in more than one group, and keep the most significant group-specific ones.
+        2. Highlight opposing views between groups as well as within them.
+        3. At the end of your output, imediately after the final closing curly brace of the json object, include: "<|end_of_json|>". This will signal the end of the output.
+
+
+        ## Group Analyses:
+
+        {{ group_insights }}
+
+    """
+
+QA_MODEL_NAME = "anthropic.claude-3-sonnet-20240229-v1:0"
+QA_MODEL_SETTINGS = {
     "max_tokens": 4096,
     "temperature": 0.3,
     "top_p": 0.999
-})
-def answer_question_pp(question: str, transcripts: List[str], prior_chat_messages: List[str]) -> QAResponse:
+}
+
+# Everything up to and including the transcripts is identical across the turns of a chat
+# (transcripts are serialized with serialize_transcripts), so it forms a byte-stable prompt prefix.
+# Per-turn content (chat summary, recent messages, question) only comes after it.
+@Prompter(llm="bedrock", model_name=QA_MODEL_NAME, jinja=True, model_settings=QA_MODEL_SETTINGS)
+def answer_question_pp(question: str, transcripts: str, chat_summary: str, prior_chat_messages: List[str]) -> QAResponse:
     """
     - user:
         Below are summaries and transcripts of one or multiple videos, Chat history and the user's input question.
@@ -151,7 +186,12 @@ def answer_question_pp(question: str, transcripts: List[str], prior_chat_message
         {{ transcripts }}
         
 
-        ### Chat History:
+        ### Summary of the Earlier Chat:
+
+        {{ chat_summary }}
+
+
+        ### Recent Chat History:
 
         {{ prior_chat_messages }}
 
@@ -164,26 +204,56 @@ def answer_question_pp(question: str, transcripts: List[str], prior_chat_message
         
     """
 
+@Prompter(llm="bedrock", model_name="anthropic.claude-3-sonnet-20240229-v1:0", jinja=True, model_settings={
+    "max_tokens": 1024,
+    "temperature": 0,
+    "top_p": 0.999,
+    "top_k": 1,
+    "stop_sequences": ["<|end_of_json|>"]
+})
+def summarize_chat_history_pp(previous_summary: str, new_messages: List[str]) -> ChatSummary:
+    """
+    - user:
+        Below is a summary of a chat about one or multiple videos, followed by newer chat messages that are not part of the summary yet.
+        Your task is to produce an updated summary of the whole chat, according to the guidelines.
+
+        ## Guidelines:
+
+        1. Fold the new messages into the existing summary, keeping everything from it that is still relevant.
+        2. Keep the user's requests, the answers given, and any facts, names, numbers or decisions later messages may refer to.
+        3. At the end of your output, imediately after the final closing curly brace of the json object, include: "<|end_of_json|>". This will signal the end of the output.
+
+
+        ## Existing Summary:
+
+        {{ previous_summary }}
+
+
+        ## New Messages:
+
+        {{ new_messages }}
+
+    """
+
 @Prompter(llm="bedrock", model_name="anthropic.claude-3-sonnet-20240229-v1:0", jinja=True, model_settings={
     "max_tokens": 4096,
     "temperature": 0.9,
     "top_p": 0.999,
     "top_k": 1
 })
-def generate_followup_questions_pp(transcripts: List[str]) -> FollowupQuestionsResponse:
+def generate_followup_questions_pp(video_summaries: List[str]) -> FollowupQuestionsResponse:
     """
     - user:
-        - user:
-        Below are the transcripts of the analyzed video(s). Your task is to generate follow-up questions to the LLM.
+        Below are the analysis summaries of the analyzed video(s). Your task is to generate follow-up questions to the LLM.
         
         ## Guidelines:
-        1. Provide a list of suggested follow-up questions based on the provided transcripts.
+        1. Provide a list of suggested follow-up questions based on the provided video summaries.
         2. Ensure that at least one of the questions is a forward-looking action based on the video content. Examples could include drafting a follow-up email, creating a summary of action items, or planning next steps.
         3. Be creative, this is an opportunity to engage the user and encourage further discussion.
         4. Provide up to 4 suggesions, each up to 1 or 2 short sentences. 
         5. The user will click on these questions to submit them to the LLM for answering.
 
-        ## Transcripts:
+        ## Video Summaries:
 
-        {{ transcripts }}
-    """
\ No newline at end of file
+        {{ video_summaries }}
+    """
@@ -0,0 +1,57 @@
+import re
+import json
+import hashlib
+import threading
+from chalicelib.cache import TTLCache
+from chalicelib.config import config
+from chalicelib.prompters import QA_MODEL_NAME, QA_MODEL_SETTINGS
+
+# Cache of Q&A answers for questions that don't depend on the chat so far (clicked follow-up
+# suggestions, or the first question of a chat). Keyed by the partner id, the normalized question,
+# the analyzed entry ids and a digest of their transcripts, and the Q&A model config. Answers that
+# are cached are computed from the question alone, without the asking user's chat.
+# Cached values are {'answer': dict, 'latency': seconds the original LLM call took}.
+
+qa_cache = TTLCache(maxsize=config.qa_cache_size, ttl=config.qa_cache_ttl)
+
+_lock = threading.Lock()
+_latency_saved = 0.0
+
+_model_key = hashlib.sha256(json.dumps({'model': QA_MODEL_NAME, 'settings': QA_MODEL_SETTINGS}, sort_keys=True).encode('utf-8')).hexdigest()
+
+def serialize_transcripts(transcripts):
+    # Deterministic serialization, so the same videos always render to the same prompt bytes
+    if isinstance(transcripts, dict):
+        return json.dumps({video_id: transcripts[video_id] for video_id in sorted(transcripts)}, ensure_ascii=False)
+    return json.dumps(transcripts, ensure_ascii=False)
+
+def normalize_question(question):
+    return re.sub(r'\s+', ' ', question or '').strip().lower().rstrip('?.! ')
+
+def qa_cache_key(pid, question, transcripts, serialized_transcripts):
+    video_ids = tuple(sorted(transcripts)) if isinstance(transcripts, dict) else ()
+    transcripts_digest = hashlib.sha256(serialized_transcripts.encode('utf-8')).hexdigest()
+    return (str(pid), normalize_question(question), video_ids, transcripts_digest, _model_key)
+
+def is_context_free(chat_history, suggested):
+    # Answers to questions asked after an LLM reply may depend on that reply, so they are not shared
+    if suggested:
+        return True
+    return not any(isinstance(message, dict) and message.get('sender') == 'LLM' for message in chat_history or [])
+
+def get_cached_answer(key):
+    global _latency_saved
+    cached = qa_cache.get(key)
+    if cached is not None:
+        with _lock:
+            _latency_saved += cached['latency']
+    return cached
+
+def set_cached_answer(key, answer, latency):
+    qa_cache.set(key, {'answer': answer, 'latency': latency})
+
+def qa_cache_stats():
+    stats = qa_cache.stats()
+    with _lock:
+        stats['latency_saved'] = round(_latency_saved, 3)
+    return stats
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import traceback
+from chalicelib.config import config
+from chalicelib.utils import logger
+
+# Local store of VideoSummary results, written by the offline batch analysis (batch_analyze.py)
+# and read by the interactive flow as a cache. Results are keyed by the caption asset and the caption
+# version they were computed from, so an edited or re-generated caption is analyzed again (a caption
+# keeps its id when it is edited in place, only its version changes). Only the latest result of a
+# caption asset is kept.
+
+class ResultStore:
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self._lock = threading.Lock()
+        if read_only:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS video_summaries (
+                    pid TEXT NOT NULL,
+                    entry_id TEXT NOT NULL,
+                    caption_id TEXT NOT NULL,
+                    caption_version TEXT NOT NULL DEFAULT '',
+                    summary TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (pid, entry_id, caption_id)
+                )""")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(video_summaries)")]
+            if 'caption_version' not in columns:
+                # Stores written before caption versions were tracked: their results never match a version, so are re-analyzed
+                self._conn.execute("ALTER TABLE video_summaries ADD COLUMN caption_version TEXT NOT NULL DEFAULT ''")
+            self._conn.commit()
+
+    def get(self, pid, entry_id, caption_id, caption_version):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM video_summaries WHERE pid = ? AND entry_id = ? AND caption_id = ? AND caption_version = ?",
+                (str(pid), entry_id, caption_id, str(caption_version))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, pid, entry_id, caption_id, caption_version, summary):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO video_summaries (pid, entry_id, caption_id, caption_version, summary, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (str(pid), entry_id, caption_id, str(caption_version), json.dumps(summary), time.time()))
+            self._conn.commit()
+
+    def export_jsonl(self, path):
+        count = 0
+        with self._lock, open(path, 'w', encoding='utf-8') as f:
+            for pid, entry_id, caption_id, caption_version, summary in self._conn.execute(
+                    "SELECT pid, entry_id, caption_id, caption_version, summary FROM video_summaries ORDER BY pid, entry_id"):
+                f.write(json.dumps({'pid': pid, 'entry_id': entry_id, 'caption_id': caption_id, 'caption_version': caption_version,
+                                    'summary': json.loads(summary)}) + '\n')
+                count += 1
+        return count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_stored_summary(pid, entry_id, caption_id, caption_version):
+    global _store
+    if not config.result_store_path or not os.path.exists(config.result_store_path):
+        return None
+    try:
+        with _store_lock:
+            if _store is None:
+                _store = ResultStore(config.result_store_path, read_only=True)
+        return _store.get(pid, entry_id, caption_id, caption_version)
+    except Exception as e:
+        logger.error(f"Error reading the result store for entry ID {entry_id}: {e}")
+        logger.error(traceback.format_exc())
+        return None
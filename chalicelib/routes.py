@@ -2,10 +2,11 @@ import json
 import time
 from chalice import Response
 from chalice.app import WebsocketEvent
-from chalicelib.prompters import answer_question_pp
-from chalicelib.kaltura_utils import fetch_videos, validate_ks
+from chalicelib.kaltura_utils import fetch_videos, invalidate_video_search_cache, validate_ks
+from chalicelib.config import config
+from chalicelib.prefetch import prefetch_transcripts, wait_for_prefetch
 from chalicelib.utils import handle_error, send_ws_message, logger
-from chalicelib.analyze import analyze_videos_ws, generate_followup_questions_ws
+from chalicelib.analyze import analyze_videos_ws, generate_followup_questions_ws, answer_question_ws
 
 # Set to track processed request IDs
 processed_request_ids = set()
@@ -50,23 +51,31 @@ def websocket_handler(event: WebsocketEvent, app):
             if action == 'get_videos':
                 category_id = message.get('categoryId')
                 free_text = message.get('freeText')
-                videos = fetch_videos(ks, pid, category_id, free_text)
-                send_ws_message(app, connection_id, request_id, 'videos', videos, pid)
+                cursor = message.get('cursor')
+                if message.get('refresh'):
+                    # Sent by the search button: a new search drops the partner's cached pages, paging reuses them
+                    invalidate_video_search_cache(pid)
+                videos_page = fetch_videos(ks, pid, category_id, free_text, cursor=cursor)
+                send_ws_message(app, connection_id, request_id, 'videos', videos_page, pid)
+                if config.transcript_prefetch:
+                    prefetch_transcripts(app, connection_id, ks, pid, [video['entry_id'] for video in videos_page['videos']])
+                    wait_for_prefetch(connection_id, config.prefetch_wait_seconds)
 
             elif action == 'analyze_videos':
                 selected_videos = message.get('selectedVideos', [])
                 analyze_videos_ws(app, connection_id, request_id, selected_videos, ks, pid)
                 
             elif action == 'generate_followup_questions':
-                transcripts = message.get('transcripts', [])
-                generate_followup_questions_ws(app, connection_id, request_id, transcripts, pid)
+                analysis_results = message.get('analysisResults', [])
+                generate_followup_questions_ws(app, connection_id, request_id, analysis_results, pid)
                 
             elif action == 'ask_question':
                 question = message.get('question', 'Can you create a list of exploratory questions for these videos?')
                 transcripts = message.get('transcripts', []) 
                 prior_chat_messages = message.get('chat_history', []) 
-                response = answer_question_pp(question=question, transcripts=transcripts, prior_chat_messages=prior_chat_messages)
-                send_ws_message(app, connection_id, request_id, 'chat_response', response.model_dump(), pid)
+                session_id = message.get('session_id') or connection_id
+                suggested = bool(message.get('suggested', False))
+                answer_question_ws(app, connection_id, request_id, session_id, question, transcripts, prior_chat_messages, pid, suggested)
                 
         finally:
             # Ensure removal of the request_id from the processed set
@@ -1,42 +1,73 @@
 import json
+import zlib
+import hashlib
+from array import array
+from chalicelib.compact_transcript import CompactTranscript
 
-def chunk_transcript(data, max_chars=150000, overlap=10000):
-    def get_json_size(segment):
-        return len(json.dumps(segment))
+def chunk_transcript(data, max_chars=150000, overlap=10000, min_chars=75000, boundary_divisor=256):
+    # Chunks are TranscriptSlice views over a single CompactTranscript, nothing is copied
+    transcript = data if isinstance(data, CompactTranscript) else CompactTranscript.from_caption_objects(data)
 
-    def add_segment(segments, segment):
-        segments.append(segment)
+    # Size of each segment inside a JSON list, including the ', ' separator
+    item_sizes = array('q', (len(json.dumps(segment.to_dict())) + 2 for segment in transcript))
 
-    # Order the transcript by startTime in ascending order
-    data.sort(key=lambda x: x['startTime'])
+    def is_boundary(index):
+        # Chunk boundaries are picked by the sentence content rather than its position,
+        # so editing one part of the transcript doesn't shift every later chunk
+        return zlib.crc32(transcript.segment_text(index).encode('utf-8')) % boundary_divisor == 0
+
+    def overlap_start(stop):
+        # The next chunk repeats the last sentences of the previous one, up to `overlap` characters
+        start = stop
+        overlap_chars = 0
+        while start > 0 and overlap_chars + len(transcript.segment_text(start - 1)) <= overlap:
+            overlap_chars += len(transcript.segment_text(start - 1))
+            start -= 1
+        return start, 2 + sum(item_sizes[start:stop])
 
     segments = []
-    current_segment = []
-    text_buffer = ''
-    
-    # Chunk the transcript into segments
-    for entry in data:
-        for content in entry['content']:
-            sentences = content['text'].split('\n')
-            for sentence in sentences:
-                if sentence:
-                    sentence += '\n'
-                    if not current_segment:
-                        current_segment.append({'startTime': entry['startTime'], 'endTime': entry['endTime'], 'text': sentence.strip()})
-                    else:
-                        temp_segment = current_segment + [{'startTime': entry['startTime'], 'endTime': entry['endTime'], 'text': sentence.strip()}]
-                        temp_size = get_json_size(temp_segment)
-                        
-                        if temp_size > max_chars:
-                            add_segment(segments, current_segment)
-                            overlap_text = text_buffer[-overlap:].strip()
-                            current_segment = [{'startTime': entry['startTime'], 'endTime': entry['endTime'], 'text': overlap_text}]
-                        else:
-                            current_segment.append({'startTime': entry['startTime'], 'endTime': entry['endTime'], 'text': sentence.strip()})
-                    
-                    text_buffer += sentence
-    
-    if current_segment:
-        add_segment(segments, current_segment)
-
-    return segments
\ No newline at end of file
+    start = 0
+    current_size = 2
+    has_new_content = False
+
+    for index in range(len(transcript)):
+        # Hard limit: close the segment before it grows past max_chars
+        if has_new_content and current_size + item_sizes[index] > max_chars:
+            segments.append(transcript[start:index])
+            start, current_size = overlap_start(index)
+
+        current_size += item_sizes[index]
+        has_new_content = True
+
+        # Content-defined boundary: close the segment after this sentence
+        if current_size >= min_chars and is_boundary(index):
+            segments.append(transcript[start:index + 1])
+            start, current_size = overlap_start(index + 1)
+            has_new_content = False
+
+    if has_new_content:
+        segments.append(transcript[start:len(transcript)])
+
+    return segments
+
+def chunk_hash(segment_json):
+    return hashlib.sha256(segment_json.encode('utf-8')).hexdigest()
+
+def chunks_digest(chunk_hashes):
+    return hashlib.sha256('\n'.join(chunk_hashes).encode('utf-8')).hexdigest()
+
+def snap_summary_times(summary, transcript):
+    # Section and insight start times should point at the start of a transcript segment.
+    # Move the ones that don't to the start of the segment they fall in.
+    if not len(transcript):
+        return 0
+    adjusted = 0
+    for item in summary.get('sections', []) + summary.get('insights', []):
+        start_time = item.get('start_time')
+        if not isinstance(start_time, (int, float)):
+            continue
+        segment_start = transcript.segment_at(start_time).start_time
+        if segment_start != start_time:
+            item['start_time'] = int(segment_start)
+            adjusted += 1
+    return adjusted
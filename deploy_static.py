@@ -1,47 +1,125 @@
 import boto3
 import os
+import sys
+import gzip
+import json
 import time
+import hashlib
+import argparse
 from pathlib import Path
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
 
 AWS_REGION = 'us-east-1'
 S3_BUCKET_NAME = 'zoharbabintest'
 CLOUDFRONT_DISTRIBUTION_ID = 'E1EJTL378WS6GY'
 LOCAL_STATIC_DIR = './static'
+MANIFEST_KEY = '.deploy-manifest.json'
+UPLOAD_WORKERS = 8
+MAX_INVALIDATION_PATHS = 3000  # CloudFront limit per invalidation batch, above it the whole distribution is invalidated
 
-s3_client = boto3.client('s3', region_name=AWS_REGION)
-cloudfront_client = boto3.client('cloudfront', region_name=AWS_REGION)
-
-def upload_files_to_s3():
-    for root, dirs, files in os.walk(LOCAL_STATIC_DIR):
-        for file in files:
-            file_path = os.path.join(root, file)
-            s3_key = str(Path(file_path).relative_to(LOCAL_STATIC_DIR))
-            content_type, _ = mimetypes.guess_type(file_path)
-            if content_type is None:
-                content_type = 'binary/octet-stream'  # default fallback
-
-            print(f'Uploading {file_path} to s3://{S3_BUCKET_NAME}/{s3_key} with ContentType {content_type}')
-            s3_client.upload_file(
-                file_path,
-                S3_BUCKET_NAME,
-                s3_key,
-                ExtraArgs={'ContentType': content_type}
-            )
-
-def invalidate_cloudfront_cache():
-    invalidation = cloudfront_client.create_invalidation(
-        DistributionId=CLOUDFRONT_DISTRIBUTION_ID,
+# Set these to deploy against local S3/CloudFront stand-ins (e.g. LocalStack or a moto server)
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+CLOUDFRONT_ENDPOINT_URL = os.getenv('CLOUDFRONT_ENDPOINT_URL')
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+# Browsers re-check after 5 minutes, CloudFront keeps a day; each deploy invalidates the changed paths at the edge
+CACHE_CONTROL = 'public, max-age=300, s-maxage=86400'
+
+s3_client = boto3.client('s3', region_name=AWS_REGION, endpoint_url=S3_ENDPOINT_URL)
+cloudfront_client = boto3.client('cloudfront', region_name=AWS_REGION, endpoint_url=CLOUDFRONT_ENDPOINT_URL)
+
+def list_static_files(static_dir=LOCAL_STATIC_DIR):
+    files = {}
+    for root, dirs, names in os.walk(static_dir):
+        for name in names:
+            file_path = os.path.join(root, name)
+            s3_key = Path(file_path).relative_to(static_dir).as_posix()
+            with open(file_path, 'rb') as f:
+                files[s3_key] = {'path': file_path, 'hash': hashlib.sha256(f.read()).hexdigest()}
+    return files
+
+def load_manifest(bucket=S3_BUCKET_NAME, client=s3_client):
+    try:
+        body = client.get_object(Bucket=bucket, Key=MANIFEST_KEY)['Body'].read()
+        return json.loads(body)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return {}
+        raise
+
+def save_manifest(manifest, bucket=S3_BUCKET_NAME, client=s3_client):
+    client.put_object(Bucket=bucket, Key=MANIFEST_KEY, Body=json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'),
+                      ContentType='application/json', CacheControl='no-store')
+
+def build_upload(s3_key, file_path):
+    """Returns the (key, body, extra args) to upload for a static file, precompressed where worthwhile."""
+    content_type, _ = mimetypes.guess_type(file_path)
+    if content_type is None:
+        content_type = 'binary/octet-stream'  # default fallback
+    with open(file_path, 'rb') as f:
+        body = f.read()
+    extra_args = {'ContentType': content_type, 'CacheControl': CACHE_CONTROL}
+
+    if content_type.startswith(COMPRESSIBLE_TYPES):
+        # Served gzip-encoded, every browser accepts it
+        gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(gzipped) < len(body):
+            return s3_key, gzipped, {**extra_args, 'ContentEncoding': 'gzip'}
+    return s3_key, body, extra_args
+
+def upload_object(s3_key, body, extra_args, bucket=S3_BUCKET_NAME, client=s3_client):
+    print(f"Uploading s3://{bucket}/{s3_key} ({len(body)} bytes) with ContentType {extra_args['ContentType']}"
+          f"{', ContentEncoding ' + extra_args['ContentEncoding'] if 'ContentEncoding' in extra_args else ''}")
+    client.put_object(Bucket=bucket, Key=s3_key, Body=body, **extra_args)
+    return s3_key
+
+def upload_files_to_s3(static_dir=LOCAL_STATIC_DIR, bucket=S3_BUCKET_NAME, client=s3_client, force=False, dry_run=False):
+    """Uploads the static files that changed since the last deploy. Returns the list of uploaded keys."""
+    files = list_static_files(static_dir)
+    manifest = load_manifest(bucket, client)
+    changed = sorted(key for key, info in files.items() if force or manifest.get(key) != info['hash'])
+    print(f'{len(changed)} of {len(files)} static files changed')
+    if dry_run or not changed:
+        return changed
+
+    uploads = [build_upload(key, files[key]['path']) for key in changed]
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        uploaded = list(executor.map(lambda upload: upload_object(*upload, bucket=bucket, client=client), uploads))
+
+    # Written last, so files of a failed deploy are uploaded again next time
+    save_manifest({key: info['hash'] for key, info in files.items()}, bucket, client)
+    return uploaded
+
+def invalidate_cloudfront_cache(s3_keys, distribution_id=CLOUDFRONT_DISTRIBUTION_ID, client=cloudfront_client):
+    paths = sorted({f'/{key}' for key in s3_keys})
+    if not paths:
+        print('Nothing to invalidate')
+        return None
+    if len(paths) > MAX_INVALIDATION_PATHS:
+        paths = ['/*']
+    invalidation = client.create_invalidation(
+        DistributionId=distribution_id,
         InvalidationBatch={
             'Paths': {
-                'Quantity': 1,
-                'Items': ['/*']
+                'Quantity': len(paths),
+                'Items': paths
             },
             'CallerReference': str(time.time())
         }
     )
-    print(f'Invalidation ID: {invalidation["Invalidation"]["Id"]}')
+    print(f'Invalidation ID: {invalidation["Invalidation"]["Id"]} for {paths}')
+    return invalidation
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Upload changed static files to S3 and invalidate them on CloudFront.')
+    parser.add_argument('--force', action='store_true', help='Upload every file, even if it did not change')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the changed files')
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    upload_files_to_s3()
-    invalidate_cloudfront_cache()
+    args = parse_args(sys.argv[1:])
+    uploaded_keys = upload_files_to_s3(force=args.force, dry_run=args.dry_run)
+    if not args.dry_run:
+        invalidate_cloudfront_cache(uploaded_keys)
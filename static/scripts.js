@@ -7,6 +7,9 @@ document.addEventListener("DOMContentLoaded", function () {
     let analysisResults = null;
     let transcripts = null;
     let chatHistory = []; // Array to hold chat messages
+    const chatSessionId = generateUUID(); // Lets the server keep a rolling summary of this chat
+    let lastVideoSearch = null; // Last search query, used to page through its results
+    let videosPage = null; // Current page of search results (holds the paging cursors)
 
     function connectWebSocket() {
         socket = new WebSocket('wss://har90gdk9f.execute-api.us-east-1.amazonaws.com/vidbot/');
@@ -51,15 +54,15 @@ document.addEventListener("DOMContentLoaded", function () {
     if (reloadFollowupQuestionsButton) {
         reloadFollowupQuestionsButton.originalText = reloadFollowupQuestionsButton.textContent;
         reloadFollowupQuestionsButton.addEventListener('click', function () {
-            generateFollowupQuestions(transcripts);
+            generateFollowupQuestions(analysisResults);
         });
     } else {
         console.error('Reload Follow-up Questions button not found');
     }
 
-    function generateFollowupQuestions(videoTranscripts) {
+    function generateFollowupQuestions(videoAnalysisResults) {
         showFollowupQuestionsLoading();
-        sendMessage('generate_followup_questions', { transcripts: videoTranscripts });
+        sendMessage('generate_followup_questions', { analysisResults: videoAnalysisResults });
     }
 
     function sendMessage(action, data, button) {
@@ -91,7 +94,9 @@ document.addEventListener("DOMContentLoaded", function () {
         switch (message.stage) {
             case 'videos':
                 // Handle search videos list results
-                displayVideos(message.data, message.pid);
+                videosPage = message.data;
+                displayVideos(message.data.videos, message.pid);
+                updateVideosPager();
                 stopLoadingIndicator();
                 closeAllAccordions();
                 openAccordionsByIds('videos-card');
@@ -121,7 +126,13 @@ document.addEventListener("DOMContentLoaded", function () {
                 transcripts = message.data.transcripts;
                 hideAccordion('progress-section');
                 resetProgress();
-                generateFollowupQuestions(transcripts);
+                // Follow-up questions are generated alongside the cross video insights
+                if (message.data.followup_questions) {
+                    displayFollowupQuestions(message.data.followup_questions.questions);
+                    openAccordionsByIds('followup-questions-card');
+                } else {
+                    generateFollowupQuestions(analysisResults);
+                }
                 break;
             case 'followup_questions':
                 const followupQuestions = message.data.questions;
@@ -194,7 +205,7 @@ document.addEventListener("DOMContentLoaded", function () {
 
     function sendSuggestionToChat(question) {
         displayChatMessage('You', question);
-        sendMessage('ask_question', { question: question, analysisResults: analysisResults, transcripts: transcripts, chat_history: chatHistory }, sendChatButton);
+        sendMessage('ask_question', { question: question, analysisResults: analysisResults, transcripts: transcripts, chat_history: chatHistory, session_id: chatSessionId, suggested: true }, sendChatButton);
     }
 
     function showFollowupQuestionsLoading() {
@@ -463,7 +474,34 @@ document.addEventListener("DOMContentLoaded", function () {
     function handleGetVideos() {
         const categoryId = categoryIdInput.value === "" ? null : categoryIdInput.value;
         const freeText = freeTextInput.value === "" ? null : freeTextInput.value;
-        sendMessage('get_videos', { categoryId, freeText }, getVideosCategoryTextButton);
+        lastVideoSearch = { categoryId, freeText };
+        // A new search asks for fresh results, paging through them is served from the search cache
+        sendMessage('get_videos', { categoryId, freeText, refresh: true }, getVideosCategoryTextButton);
+    }
+
+    function updateVideosPager() {
+        if (videosPrevPageButton) videosPrevPageButton.disabled = !(videosPage && videosPage.prev_cursor);
+        if (videosNextPageButton) videosNextPageButton.disabled = !(videosPage && videosPage.next_cursor);
+    }
+
+    function handleVideosPage(cursor, button) {
+        if (!lastVideoSearch || !cursor) return;
+        sendMessage('get_videos', { ...lastVideoSearch, cursor }, button);
+    }
+
+    const videosPrevPageButton = document.getElementById('videos-prev-page-button');
+    const videosNextPageButton = document.getElementById('videos-next-page-button');
+    if (videosPrevPageButton && videosNextPageButton) {
+        videosPrevPageButton.originalText = videosPrevPageButton.textContent;
+        videosNextPageButton.originalText = videosNextPageButton.textContent;
+        videosPrevPageButton.addEventListener('click', function () {
+            handleVideosPage(videosPage && videosPage.prev_cursor, this);
+        });
+        videosNextPageButton.addEventListener('click', function () {
+            handleVideosPage(videosPage && videosPage.next_cursor, this);
+        });
+    } else {
+        console.error('Search results pager buttons not found');
     }
     if (getVideosCategoryTextButton) {
         getVideosCategoryTextButton.originalText = getVideosCategoryTextButton.textContent;
@@ -478,7 +516,7 @@ document.addEventListener("DOMContentLoaded", function () {
         sendChatButton.addEventListener('click', function () {
             const question = chatInput.value.trim();
             displayChatMessage('You', question);
-            sendMessage('ask_question', { question: question, transcripts: transcripts, chat_history: chatHistory }, sendChatButton);
+            sendMessage('ask_question', { question: question, transcripts: transcripts, chat_history: chatHistory, session_id: chatSessionId }, sendChatButton);
             chatInput.value = ''; // Clear the input field
         });
     } else {
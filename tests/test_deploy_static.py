@@ -0,0 +1,92 @@
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+from io import BytesIO
+from botocore.exceptions import ClientError
+import deploy_static
+
+BUCKET = 'static-bucket'
+DISTRIBUTION_ID = 'DISTRIBUTION'
+
+class StubS3:
+    """Stands in for the S3 client: keeps the uploaded objects in memory."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploaded_keys = []
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'Not Found'}}, 'GetObject')
+        return {'Body': BytesIO(self.objects[Key]['Body'])}
+
+    def put_object(self, Bucket, Key, Body, **extra_args):
+        self.objects[Key] = {'Body': Body, **extra_args}
+        if Key != deploy_static.MANIFEST_KEY:
+            self.uploaded_keys.append(Key)
+
+class StubCloudFront:
+    def __init__(self):
+        self.invalidations = []
+
+    def create_invalidation(self, DistributionId, InvalidationBatch):
+        self.invalidations.append(InvalidationBatch['Paths']['Items'])
+        return {'Invalidation': {'Id': f'I{len(self.invalidations)}'}}
+
+class DeployStaticTest(unittest.TestCase):
+    def setUp(self):
+        self.static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_dir)
+        self.write_file('scripts.js', 'console.log("hello");\n' * 50)
+        self.write_file('styles.css', 'body { margin: 0; }\n' * 50)
+        self.write_file('img/logo.png', '\x89PNG')
+        self.s3 = StubS3()
+        self.cloudfront = StubCloudFront()
+
+    def write_file(self, name, content):
+        path = os.path.join(self.static_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def deploy(self):
+        uploaded = deploy_static.upload_files_to_s3(self.static_dir, BUCKET, client=self.s3)
+        deploy_static.invalidate_cloudfront_cache(uploaded, DISTRIBUTION_ID, client=self.cloudfront)
+        return uploaded
+
+    def test_first_deploy_uploads_everything(self):
+        uploaded = self.deploy()
+
+        self.assertEqual(sorted(uploaded), ['img/logo.png', 'scripts.js', 'styles.css'])
+        self.assertEqual(self.cloudfront.invalidations, [['/img/logo.png', '/scripts.js', '/styles.css']])
+        script = self.s3.objects['scripts.js']
+        self.assertEqual(script['ContentEncoding'], 'gzip')
+        self.assertEqual(gzip.decompress(script['Body']).decode('utf-8'), 'console.log("hello");\n' * 50)
+        self.assertEqual(script['CacheControl'], deploy_static.CACHE_CONTROL)
+        self.assertNotIn('ContentEncoding', self.s3.objects['img/logo.png'])
+
+    def test_rerun_without_changes_does_nothing(self):
+        self.deploy()
+        self.s3.uploaded_keys.clear()
+
+        uploaded = self.deploy()
+
+        self.assertEqual(uploaded, [])
+        self.assertEqual(self.s3.uploaded_keys, [])
+        self.assertEqual(len(self.cloudfront.invalidations), 1)
+
+    def test_only_changed_files_are_uploaded_and_invalidated(self):
+        self.deploy()
+        self.s3.uploaded_keys.clear()
+        self.write_file('styles.css', 'body { margin: 1rem; }\n')
+
+        uploaded = self.deploy()
+
+        self.assertEqual(uploaded, ['styles.css'])
+        self.assertEqual(self.s3.uploaded_keys, ['styles.css'])
+        self.assertEqual(self.cloudfront.invalidations[-1], ['/styles.css'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from chalicelib import kaltura_utils
+from chalicelib.kaltura_utils import fetch_videos, invalidate_video_search_cache, video_search_cache
+
+PID = 12345
+OTHER_PID = 67890
+
+def make_entry(index):
+    return SimpleNamespace(id=f"0_entry{index}", name=f"Video {index}", description=None, mediaType=SimpleNamespace(value=1),
+                           createdAt=1700000000 + index, msDuration=60000, lastPlayedAt=None, application=None,
+                           creatorId=None, tags=None, referenceId=None)
+
+class StubESearch:
+    """Stands in for client.elasticSearch.eSearch and counts the searchEntry backend calls."""
+
+    def __init__(self, total_count=20):
+        self.total_count = total_count
+        self.calls = 0
+
+    def searchEntry(self, search_params, pager):
+        self.calls += 1
+        first = (pager.pageIndex - 1) * pager.pageSize
+        indexes = range(first, min(first + pager.pageSize, self.total_count))
+        return SimpleNamespace(objects=[SimpleNamespace(object=make_entry(index)) for index in indexes], totalCount=self.total_count)
+
+class VideoSearchCacheTest(unittest.TestCase):
+    def setUp(self):
+        video_search_cache.invalidate(lambda key: True)
+        self.esearch = StubESearch()
+        client = SimpleNamespace(elasticSearch=SimpleNamespace(eSearch=self.esearch))
+        patcher = mock.patch.object(kaltura_utils, 'get_kaltura_client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_paging_back_is_served_from_the_cache(self):
+        first_page = fetch_videos('ks', PID, number_of_videos=6)
+        second_page = fetch_videos('ks', PID, number_of_videos=6, cursor=first_page['next_cursor'])
+        back_page = fetch_videos('ks', PID, number_of_videos=6, cursor=second_page['prev_cursor'])
+
+        self.assertEqual(self.esearch.calls, 2)
+        self.assertEqual(back_page, first_page)
+        self.assertEqual(second_page['videos'][0]['entry_id'], '0_entry6')
+        self.assertIsNone(first_page['prev_cursor'])
+
+    def test_last_page_has_no_next_cursor(self):
+        page = fetch_videos('ks', PID, number_of_videos=10)
+        page = fetch_videos('ks', PID, number_of_videos=10, cursor=page['next_cursor'])
+
+        self.assertIsNone(page['next_cursor'])
+        self.assertEqual(page['total_count'], 20)
+
+    def test_invalidation_forces_a_new_backend_call(self):
+        fetch_videos('ks', PID, number_of_videos=6)
+        fetch_videos('ks', OTHER_PID, number_of_videos=6)
+        invalidate_video_search_cache(PID)
+        fetch_videos('ks', PID, number_of_videos=6)
+        fetch_videos('ks', OTHER_PID, number_of_videos=6)
+
+        self.assertEqual(self.esearch.calls, 3)
+
+if __name__ == '__main__':
+    unittest.main()